@@ -0,0 +1,40 @@
+from typing import List
+
+import numpy as np
+
+def choose_k(similarities: List[float], min_k: int, max_k: int, min_gap: float = 0.05) -> int:
+    """How many candidates to keep, read off the similarity distribution.
+
+    Looks for the largest drop between consecutive scores (sorted, best first)
+    that leaves between min_k and max_k results; if no drop reaches min_gap the
+    scores decay smoothly and the elbow (the point farthest from the line
+    joining the first and last candidate) is used instead.
+    """
+    scores = np.sort(np.asarray(similarities, dtype=np.float32))[::-1]
+    upper = min(max_k, scores.size)
+    lower = max(1, min(min_k, upper))
+    if upper <= lower:
+        return upper
+
+    scores = scores[:upper]
+    # gaps[c - 1] is the drop after keeping c results
+    gaps = scores[:-1] - scores[1:]
+    candidates = np.arange(lower, upper)
+    best = int(candidates[np.argmax(gaps[candidates - 1])])
+    if gaps[best - 1] >= min_gap:
+        return best
+
+    positions = np.arange(upper, dtype=np.float32)
+    chord = scores[0] + (scores[-1] - scores[0]) * positions / (upper - 1)
+    deviation = np.abs(chord - scores)
+    if deviation.max() < min_gap / 2:
+        return upper  # near-linear decay, no elbow to cut at
+    elbow = int(np.argmax(deviation)) + 1
+    return int(min(max(elbow, lower), upper))
+
+def trim_to_adaptive_k(results: List[dict], min_k: int, max_k: int, min_gap: float = 0.05) -> List[dict]:
+    """Sort result dicts by similarity_score and keep the adaptive number of them"""
+    ranked = sorted(results, key=lambda result: result["similarity_score"], reverse=True)
+    if not ranked:
+        return ranked
+    return ranked[:choose_k([result["similarity_score"] for result in ranked], min_k, max_k, min_gap)]
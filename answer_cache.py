@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+class SemanticAnswerCache:
+    """Answers keyed on the question embedding.
+
+    A lookup returns the stored response of the most similar earlier question
+    when the cosine similarity reaches ``similarity_threshold`` and the entry
+    was produced with the same request parameters. Each entry records the chunk
+    IDs its answer was grounded on, and deleting or replacing those chunks
+    invalidates just that entry. Entries live in SQLite (shared by every
+    manager using the same path); their unit-length embeddings are loaded on
+    first lookup and kept in memory as one matrix, so a lookup is a single
+    matrix-vector product.
+    """
+
+    def __init__(self, cache_path: str, similarity_threshold: float = 0.95, max_entries: int = 5000):
+        self.cache_path = cache_path
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, "
+            "params TEXT NOT NULL, corpus_version INTEGER NOT NULL, embedding BLOB NOT NULL, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        # corpus_version is no longer matched on (invalidation is per chunk); kept so older cache files stay valid
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answer_chunks (chunk_id TEXT NOT NULL, answer_id INTEGER NOT NULL, "
+            "PRIMARY KEY (chunk_id, answer_id))"
+        )
+        self._db.commit()
+        self._loaded = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._load()
+
+    def _load(self):
+        # Only entries embedded like the newest one can match; others came from an earlier embedding model
+        rows = self._db.execute(
+            "SELECT id, params, embedding FROM answers WHERE length(embedding) = "
+            "(SELECT length(embedding) FROM answers ORDER BY id DESC LIMIT 1) ORDER BY id"
+        ).fetchall()
+        self._ids: List[int] = [row[0] for row in rows]
+        self._params: List[str] = [row[1] for row in rows]
+        self._matrix = (
+            np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+            if rows else np.zeros((0, 0), dtype=np.float32)
+        )
+        self._loaded = True
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, query_vector: List[float], params: str = "") -> Optional[Dict[str, Any]]:
+        """Cached response for a question close enough to an earlier one, or None (also when the cache fails)"""
+        with self._lock:
+            try:
+                self._ensure_loaded()
+                for attempt in range(2):
+                    if not self._ids:
+                        break
+                    query = self._unit(query_vector)
+                    if query.shape[0] != self._matrix.shape[1]:
+                        break
+                    similarities = self._matrix @ query
+                    similarities[np.array([p != params for p in self._params])] = -1.0
+                    best = int(np.argmax(similarities))
+                    if similarities[best] < self.similarity_threshold:
+                        break
+                    entry_id = self._ids[best]
+                    row = self._db.execute("SELECT response FROM answers WHERE id = ?", (entry_id,)).fetchone()
+                    if row is None:
+                        # Invalidated through another manager sharing the cache file
+                        self._load()
+                        continue
+                    self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+                    self._db.commit()
+                    self.hits += 1
+                    return json.loads(row[0])
+            except Exception as e:
+                print(f"Error looking up cached answer: {str(e)}")
+            self.misses += 1
+            return None
+
+    def store(self, question: str, query_vector: List[float], response: Dict[str, Any], chunk_ids: Iterable[str],
+              params: str = ""):
+        """Cache a response with the chunk IDs it depends on, trimming the least recently used entries"""
+        with self._lock:
+            self._ensure_loaded()
+            now = time.time()
+            embedding = self._unit(query_vector)
+            cursor = self._db.execute(
+                "INSERT INTO answers (question, params, corpus_version, embedding, response, created_at, last_used) "
+                "VALUES (?, ?, 0, ?, ?, ?, ?)",
+                (question, params, embedding.tobytes(), json.dumps(response), now, now)
+            )
+            answer_id = cursor.lastrowid
+            self._db.executemany(
+                "INSERT OR IGNORE INTO answer_chunks (chunk_id, answer_id) VALUES (?, ?)",
+                [(chunk_id, answer_id) for chunk_id in set(chunk_ids) if chunk_id]
+            )
+            # A different embedding size means the embedding model changed; older answers can never match again
+            purged = self._db.execute("DELETE FROM answers WHERE length(embedding) != ?", (embedding.nbytes,)).rowcount
+            if purged:
+                self._db.execute("DELETE FROM answer_chunks WHERE answer_id NOT IN (SELECT id FROM answers)")
+            overflow = len(self._ids) + 1 - self.max_entries
+            if overflow > 0:
+                # Trim to 90% so eviction (and the matrix reload it needs) is occasional
+                self._db.execute(
+                    "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                    (int(self.max_entries * 0.9),)
+                )
+                self._db.execute("DELETE FROM answer_chunks WHERE answer_id NOT IN (SELECT id FROM answers)")
+            self._db.commit()
+            if overflow > 0 or purged:
+                self._load()
+                return
+            self._ids.append(answer_id)
+            self._params.append(params)
+            self._matrix = embedding[None, :] if not self._ids[:-1] else np.vstack([self._matrix, embedding])
+
+    def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Drop the answers grounded on any of the given chunks; returns how many were dropped"""
+        chunk_ids = list(chunk_ids)
+        with self._lock:
+            answer_ids = set()
+            for start in range(0, len(chunk_ids), 900):  # stay under SQLite's parameter limit
+                batch = chunk_ids[start:start + 900]
+                answer_ids.update(row[0] for row in self._db.execute(
+                    f"SELECT answer_id FROM answer_chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ))
+            if not answer_ids:
+                return 0
+            self._db.executemany("DELETE FROM answers WHERE id = ?", [(answer_id,) for answer_id in answer_ids])
+            self._db.executemany("DELETE FROM answer_chunks WHERE answer_id = ?", [(answer_id,) for answer_id in answer_ids])
+            self._db.commit()
+            if self._loaded:
+                self._load()
+            return len(answer_ids)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.execute("DELETE FROM answer_chunks")
+            self._db.commit()
+            self._load()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
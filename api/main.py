@@ -11,6 +11,7 @@ from pathlib import Path
 from rag_system import RAGSystem
 from document_processor import DocumentProcessor
 from vector_store_prod import ProductionVectorStoreManager
+from client_registry import get_vector_store
 from config import Config
 
 app = FastAPI(title="Policy Chat Bot API", version="1.0.0")
@@ -26,20 +27,32 @@ app.add_middleware(
 
 # Initialize components
 config = Config()
-rag_system = RAGSystem()
+# One vector store per process, shared by the RAG system and the document endpoints
+vector_store = get_vector_store(ProductionVectorStoreManager)
+rag_system = RAGSystem(vector_store)
 document_processor = DocumentProcessor()
-vector_store = ProductionVectorStoreManager()
 
 # Pydantic models
 class ChatMessage(BaseModel):
     message: str
     stream: bool = True
+    k: Optional[int] = None  # passages retrieved for the answer (upper bound with ADAPTIVE_K)
+    mmr_lambda: Optional[float] = None  # 1.0 = relevance only, lower = more diverse; defaults to MMR_LAMBDA
+    use_cache: bool = True  # False forces a fresh answer (still cached for later requests)
+    strategy: Optional[str] = None  # retrieval pipeline strategy; defaults to RAG_STRATEGY
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[dict]
     confidence: float
     total_sources_found: int
+    retrieval_mode: Optional[str] = None  # hybrid, vector or lexical (embedding API degraded)
+    cached: bool = False  # served from the semantic answer cache
+    context_tokens: Optional[int] = None  # tokens of retrieved context sent to the LLM
+    compression_ratio: Optional[float] = None  # tokens kept / retrieved with CONTEXT_COMPRESSION
+    llm_latency_ms: Optional[float] = None
+    strategy: Optional[str] = None
+    timings: Optional[dict] = None  # milliseconds spent in each pipeline stage
 
 @app.get("/")
 async def root():
@@ -65,18 +78,33 @@ async def health_check():
 @app.post("/chat")
 async def chat(chat_message: ChatMessage):
     """Chat endpoint with RAG"""
+    if chat_message.strategy and chat_message.strategy not in rag_system.pipeline.strategies:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy: {chat_message.strategy}")
     try:
-        response = rag_system.generate_response(chat_message.message)
+        response = await rag_system.agenerate_response(
+            chat_message.message, k=chat_message.k, mmr_lambda=chat_message.mmr_lambda,
+            use_cache=chat_message.use_cache, strategy=chat_message.strategy
+        )
         return ChatResponse(**response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the answer and LLM response caches"""
+    return rag_system.cache_stats()
+
 @app.post("/chat/stream")
 async def chat_stream(chat_message: ChatMessage):
     """Streaming chat endpoint"""
+    if chat_message.strategy and chat_message.strategy not in rag_system.pipeline.strategies:
+        raise HTTPException(status_code=400, detail=f"Unknown strategy: {chat_message.strategy}")
     async def generate():
         try:
-            for chunk in rag_system.generate_streaming_response(chat_message.message):
+            async for chunk in rag_system.agenerate_streaming_response(
+                chat_message.message, k=chat_message.k, mmr_lambda=chat_message.mmr_lambda,
+                use_cache=chat_message.use_cache, strategy=chat_message.strategy
+            ):
                 yield f"data: {json.dumps(chunk)}\n\n"
         except Exception as e:
             error_chunk = {
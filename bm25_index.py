@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import math
+import heapq
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Dict, Optional, Tuple, Iterable
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+
+# Words too common in questions and policies to say anything about relevance
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both but
+by can could did do does doing down during each few for from further had has have having he her here hers herself
+him himself his how i if in into is it its itself just me more most my myself no nor not now of off on once only or
+other our ours ourselves out over own same she should so some such than that the their theirs them themselves then
+there these they this those through to too under until up very was we were what when where which while who whom why
+will with would you your yours yourself yourselves
+""".split())
+# Query terms in more than this share of chunks are skipped when the query has rarer ones
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms (keeps "a.01.06" and "don't" together)"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Persistent BM25 inverted index over chunk text.
+
+    Postings (term -> {chunk_id: term frequency}) are held in memory so a query
+    only touches the chunks containing its terms. The per-chunk term counts
+    are kept in SQLite, one row per chunk, so indexing or removing a file
+    writes only that file's rows; the postings are rebuilt from them on load.
+    """
+
+    def __init__(self, index_path: str, k1: float = 1.5, b: float = 0.75):
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunk_terms (chunk_id TEXT PRIMARY KEY, terms TEXT NOT NULL)")
+        self._db.commit()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def _load(self):
+        try:
+            for chunk_id, terms in self._db.execute("SELECT chunk_id, terms FROM chunk_terms"):
+                self._insert(chunk_id, json.loads(terms))
+        except Exception as e:
+            print(f"Error loading BM25 index {self.index_path}: {str(e)}")
+            self.doc_terms, self.doc_lengths, self.postings, self.total_length = {}, {}, {}, 0
+
+    def save(self):
+        """Commit the rows written since the last save (call once per batch of adds and removes)"""
+        with self._lock:
+            self._db.commit()
+
+    def _insert(self, chunk_id: str, terms: Dict[str, int]):
+        self.doc_terms[chunk_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[chunk_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def _delete(self, chunk_id: str):
+        terms = self.doc_terms.pop(chunk_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(chunk_id, 0)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(chunk_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def add(self, chunks: Iterable[Tuple[str, str]]):
+        """Index (chunk_id, text) pairs, replacing any previous text for the same IDs"""
+        with self._lock:
+            rows = []
+            for chunk_id, text in chunks:
+                terms = dict(Counter(tokenize(text)))
+                self._delete(chunk_id)
+                self._insert(chunk_id, terms)
+                rows.append((chunk_id, json.dumps(terms)))
+            self._db.executemany("INSERT OR REPLACE INTO chunk_terms (chunk_id, terms) VALUES (?, ?)", rows)
+
+    def remove(self, chunk_ids: Iterable[str]):
+        with self._lock:
+            chunk_ids = list(chunk_ids)
+            for chunk_id in chunk_ids:
+                self._delete(chunk_id)
+            self._db.executemany("DELETE FROM chunk_terms WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+
+    def clear(self):
+        with self._lock:
+            self.doc_terms, self.doc_lengths, self.postings, self.total_length = {}, {}, {}, 0
+            self._db.execute("DELETE FROM chunk_terms")
+
+    def search(self, query: str, k: int, allowed_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, BM25 score) pairs for the query terms.
+
+        Stopwords, and terms found in more than MAX_DOCUMENT_FREQUENCY of the
+        chunks, are dropped while rarer terms remain: they add almost nothing
+        to the score but their postings cover most of the corpus.
+        """
+        terms = set(tokenize(query))
+        terms = (terms - STOPWORDS) or terms
+        allowed = set(allowed_ids) if allowed_ids is not None else None
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs or not terms:
+                return []
+            postings = [posting for posting in map(self.postings.get, terms) if posting]
+            rare = [posting for posting in postings if len(posting) <= MAX_DOCUMENT_FREQUENCY * n_docs]
+            avg_length = self.total_length / n_docs
+            scores: Dict[str, float] = {}
+            for posting in rare or postings:
+                idf = math.log(1.0 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for chunk_id, tf in posting.items():
+                    if allowed is not None and chunk_id not in allowed:
+                        continue
+                    norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+def sync_lexical_index(index: BM25Index, collection, batch_size: int = 1000) -> bool:
+    """Rebuild the BM25 index from Chroma when it has drifted out of step"""
+    if len(index) == collection.count():
+        return False
+    index.clear()
+    offset = 0
+    while True:
+        page = collection.get(include=["documents"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        index.add(zip(page["ids"], page["documents"]))
+        offset += len(page["ids"])
+    index.save()
+    print(f"Rebuilt BM25 index with {len(index)} chunks")
+    return True
+
+def reciprocal_rank_fusion(ranked_lists: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(id) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranked in ranked_lists:
+        for rank, chunk_id in enumerate(ranked, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -10,7 +10,7 @@ load_dotenv()
 
 # Import our RAG components
 from rag_system import RAGSystem
-from vector_store import VectorStoreManager
+from client_registry import get_vector_store
 from document_processor import DocumentProcessor
 from config import Config
 
@@ -28,8 +28,8 @@ def initialize_components():
     """Initialize RAG system and other components"""
     try:
         config = Config()
-        vector_store = VectorStoreManager()
-        rag_system = RAGSystem()
+        vector_store = get_vector_store()
+        rag_system = RAGSystem(vector_store)
         document_processor = DocumentProcessor()
         return {
             'config': config,
@@ -0,0 +1,201 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+
+class FileChunkIndex:
+    """Persistent mapping of file name -> ordered chunk IDs.
+
+    Files are keyed by their file name rather than the absolute path they were
+    ingested under, so the same policy uploaded from another host resolves to
+    the same entry. Chunk IDs are stored in ``chunk_index`` order.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.version = 0
+        self._positions: Dict[str, tuple] = {}
+        self._positions_version = -1
+        self._mtime = None
+        self._load()
+
+    @staticmethod
+    def file_key(file_path: str) -> str:
+        """Host-independent key for a file"""
+        return Path(str(file_path).replace("\\", "/")).name
+
+    @staticmethod
+    def make_chunk_id(file_key: str, file_hash: str, chunk_index: int) -> str:
+        """Deterministic chunk ID, stable across re-ingests of identical content"""
+        raw = f"{file_key}:{file_hash}:{chunk_index}"
+        return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        """Load the index from disk if it exists"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.version = data.get("version", 0)
+            self._mtime = os.path.getmtime(self.index_path)
+        except Exception as e:
+            print(f"Error loading file chunk index {self.index_path}: {str(e)}")
+            self.files = {}
+            self.version = 0
+
+    def save(self):
+        """Write the index atomically"""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.version, "files": self.files}, f)
+            os.replace(tmp_path, self.index_path)
+            self._mtime = os.path.getmtime(self.index_path)
+
+    def refresh(self) -> int:
+        """Reload the index if another manager instance has written it since, and return the version"""
+        with self._lock:
+            if os.path.exists(self.index_path) and os.path.getmtime(self.index_path) != self._mtime:
+                self._load()
+            return self.version
+
+    def get_chunk_ids(self, file_path: str) -> List[str]:
+        """Return the chunk IDs recorded for a file (empty if unknown)"""
+        with self._lock:
+            entry = self.files.get(self.file_key(file_path))
+            return list(entry["chunk_ids"]) if entry else []
+
+    def set_file(self, file_path: str, file_hash: str, chunk_ids: List[str]):
+        """Record the chunk IDs of a file, replacing any previous entry"""
+        with self._lock:
+            self.files[self.file_key(file_path)] = {
+                "source": file_path,
+                "file_hash": file_hash,
+                "chunk_ids": list(chunk_ids)
+            }
+            self.version += 1
+            self.save()
+
+    def remove_file(self, file_path: str) -> List[str]:
+        """Drop a file from the index and return its chunk IDs"""
+        with self._lock:
+            entry = self.files.pop(self.file_key(file_path), None)
+            if entry is None:
+                return []
+            self.version += 1
+            self.save()
+            return list(entry["chunk_ids"])
+
+    def remove_chunk_ids(self, chunk_ids: Iterable[str]):
+        """Forget individual chunk IDs (used when reconciling dangling entries)"""
+        drop = set(chunk_ids)
+        if not drop:
+            return
+        with self._lock:
+            for key in list(self.files):
+                entry = self.files[key]
+                entry["chunk_ids"] = [cid for cid in entry["chunk_ids"] if cid not in drop]
+                if not entry["chunk_ids"]:
+                    del self.files[key]
+            self.version += 1
+            self.save()
+
+    def all_chunk_ids(self) -> set:
+        """Every chunk ID referenced by the index"""
+        with self._lock:
+            return {cid for entry in self.files.values() for cid in entry["chunk_ids"]}
+
+    def chunk_position(self, chunk_id: str) -> Optional[tuple]:
+        """(file_key, position in the file's chunk order) for a chunk, or None if it is not indexed"""
+        with self._lock:
+            if self._positions_version != self.version:
+                self._positions = {
+                    cid: (key, position)
+                    for key, entry in self.files.items()
+                    for position, cid in enumerate(entry["chunk_ids"])
+                }
+                self._positions_version = self.version
+            return self._positions.get(chunk_id)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self.files = {}
+            self.version += 1
+            self.save()
+
+def group_documents_by_file(documents) -> Dict[str, list]:
+    """Group LangChain documents by file key, each group sorted by chunk_index"""
+    groups: Dict[str, list] = {}
+    for doc in documents:
+        source = doc.metadata.get("source") or doc.metadata.get("filename")
+        if not source:
+            groups.setdefault("", []).append(doc)
+            continue
+        groups.setdefault(FileChunkIndex.file_key(source), []).append(doc)
+
+    for key, docs in groups.items():
+        if key:
+            docs.sort(key=lambda d: d.metadata.get("chunk_index", 0))
+    return groups
+
+def find_orphaned_chunks(collection, index: FileChunkIndex, batch_size: int = 1000) -> Dict[str, Any]:
+    """Compare a Chroma collection against the file chunk index.
+
+    Returns chunks present in the collection but not referenced by the index
+    (grouped by file name), and index entries pointing at missing chunks.
+    """
+    indexed_ids = index.all_chunk_ids()
+    seen_ids = set()
+    orphaned: Dict[str, List[str]] = {}
+
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            break
+        for chunk_id, metadata in zip(ids, page.get("metadatas") or [{}] * len(ids)):
+            seen_ids.add(chunk_id)
+            if chunk_id in indexed_ids:
+                continue
+            metadata = metadata or {}
+            source = metadata.get("filename") or metadata.get("reference_file") or metadata.get("source") or ""
+            orphaned.setdefault(FileChunkIndex.file_key(source) if source else "", []).append(chunk_id)
+        offset += len(ids)
+
+    indexed_files = set(index.files)
+    return {
+        "orphaned_chunks": orphaned,
+        "orphaned_count": sum(len(ids) for ids in orphaned.values()),
+        "unindexed_files": sorted(key for key in orphaned if key and key not in indexed_files),
+        "dangling_ids": sorted(indexed_ids - seen_ids)
+    }
+
+def adopt_orphaned_chunks(collection, index: FileChunkIndex, file_keys: List[str]) -> int:
+    """Register existing chunks of files the index has never seen.
+
+    Used to migrate collections ingested before the index existed.
+    """
+    adopted = 0
+    for file_key in file_keys:
+        matches = collection.get(where={"filename": file_key}, include=["metadatas"])
+        ids = matches.get("ids", [])
+        if not ids:
+            continue
+        ordered = sorted(zip(ids, matches["metadatas"]), key=lambda item: (item[1] or {}).get("chunk_index", 0))
+        first_metadata = ordered[0][1] or {}
+        index.set_file(
+            first_metadata.get("source", file_key),
+            first_metadata.get("file_hash", "unknown"),
+            [chunk_id for chunk_id, _ in ordered]
+        )
+        adopted += len(ids)
+    return adopted
@@ -0,0 +1,59 @@
+import zlib
+from typing import List, Dict, Any, Iterable
+
+import numpy as np
+
+from bm25_index import tokenize, STOPWORDS
+
+def normalize_terms(text: str) -> List[str]:
+    """Lowercased, stopword-filtered terms with simple plurals folded ("clients" -> "client")"""
+    terms = []
+    for term in tokenize(text):
+        if term.endswith("'s"):
+            term = term[:-2]
+        elif len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        if term not in STOPWORDS:
+            terms.append(term)
+    return terms
+
+def term_id(term: str) -> int:
+    """Stable 32-bit ID for a term (no vocabulary file to keep in sync)"""
+    return zlib.crc32(term.encode("utf-8"))
+
+def encode_term_ids(text: str) -> str:
+    """Sorted unique term IDs of a chunk, hex-encoded for Chroma metadata"""
+    return " ".join(f"{tid:08x}" for tid in sorted({term_id(term) for term in normalize_terms(text)}))
+
+def decode_term_ids(value: str) -> np.ndarray:
+    if not value:
+        return np.zeros(0, dtype=np.uint32)
+    return np.array([int(token, 16) for token in value.split()], dtype=np.uint32)
+
+def query_term_ids(query: str) -> np.ndarray:
+    return np.unique(np.array([term_id(term) for term in normalize_terms(query)], dtype=np.uint32))
+
+def keyword_overlap(query: str, results: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """Fraction of the query's terms found in each result.
+
+    Uses the ``term_ids`` stored on the chunk at ingest, so the cost depends on
+    the number of distinct terms rather than the chunk length; chunks ingested
+    before term IDs existed are tokenized on the fly.
+    """
+    results = list(results)
+    query_ids = query_term_ids(query)
+    if not results or query_ids.size == 0:
+        return np.zeros(len(results), dtype=np.float32)
+
+    chunk_ids = []
+    for result in results:
+        stored = (result.get("metadata") or {}).get("term_ids")
+        chunk_ids.append(decode_term_ids(stored) if stored is not None else query_term_ids(result["content"]))
+
+    lengths = np.array([ids.size for ids in chunk_ids], dtype=np.int64)
+    flat = np.concatenate(chunk_ids) if lengths.sum() else np.zeros(0, dtype=np.uint32)
+    hits = np.isin(flat, query_ids)
+    # Per-result hit counts: sum each result's slice of the flattened array
+    owners = np.repeat(np.arange(len(results)), lengths)
+    counts = np.bincount(owners, weights=hits, minlength=len(results))
+    return (counts / query_ids.size).astype(np.float32)
@@ -0,0 +1,103 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+import chromadb
+from chromadb.config import Settings
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from config import Config
+from llm_cache import LLMResponseCache
+from embedding_breaker import EmbeddingBreaker
+
+CHAT_MODEL = "gpt-3.5-turbo"
+# Seconds an idle pooled connection is kept open
+KEEPALIVE_EXPIRY = 30.0
+
+_clients: Dict[Hashable, Any] = {}
+# Reentrant: building a vector store asks the registry for its embedding and Chroma clients
+_lock = threading.RLock()
+
+def shared(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """The process-wide instance for key, built by factory on first use (once, whichever thread gets there first)"""
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """(sync, async) connection pools used for every OpenAI call, so TLS setup is paid once per connection"""
+    def build():
+        limits = httpx.Limits(
+            max_connections=Config.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+        return httpx.Client(limits=limits), httpx.AsyncClient(limits=limits)
+    return shared("openai_http", build)
+
+def get_embeddings() -> OpenAIEmbeddings:
+    """The embedding client shared by every vector store, sentence index and summary index"""
+    def build():
+        http_client, http_async_client = get_http_clients()
+        return OpenAIEmbeddings(
+            openai_api_key=Config.OPENAI_API_KEY, http_client=http_client, http_async_client=http_async_client
+        )
+    return shared("embeddings", build)
+
+def get_embedding_breaker() -> EmbeddingBreaker:
+    """The circuit breaker every vector store goes through to embed queries"""
+    return shared("embedding_breaker", EmbeddingBreaker)
+
+def get_llm(model: str = CHAT_MODEL, temperature: float = 0.1, streaming: bool = True) -> ChatOpenAI:
+    """The chat client for these settings, on the shared connection pool"""
+    def build():
+        http_client, http_async_client = get_http_clients()
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            streaming=streaming,
+            api_key=Config.OPENAI_API_KEY,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+    return shared(("llm", model, temperature, streaming), build)
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """The prompt -> response cache (None when LLM_CACHE is off)"""
+    if not Config.LLM_CACHE:
+        return None
+    path = os.path.abspath(Config.LLM_CACHE_PATH)
+    return shared(("llm_cache", path), lambda: LLMResponseCache(path, Config.LLM_CACHE_MAX_ENTRIES))
+
+def get_chroma_client(path: str):
+    """The PersistentClient for a database directory (one per directory, as Chroma expects)"""
+    path = os.path.abspath(path)
+    return shared(("chroma", path), lambda: chromadb.PersistentClient(
+        path=path,
+        settings=Settings(anonymized_telemetry=False)
+    ))
+
+def get_chroma_http_client(host: str, port: int):
+    """The HttpClient for a Chroma server"""
+    return shared(("chroma_http", host, port), lambda: chromadb.HttpClient(
+        host=host,
+        port=port,
+        settings=Settings(anonymized_telemetry=False)
+    ))
+
+def get_vector_store(manager_class=None):
+    """The vector store manager of the process (VectorStoreManager unless another class is given).
+
+    Its collections, file index, BM25 and local indexes are loaded once and
+    every component that searches or writes sees the same state.
+    """
+    if manager_class is None:
+        from vector_store import VectorStoreManager
+        manager_class = VectorStoreManager
+    return shared(("vector_store", manager_class), manager_class)
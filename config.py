@@ -1,4 +1,6 @@
 import os
+import re
+import hashlib
 from dotenv import load_dotenv
 
 try:
@@ -14,6 +16,105 @@ class Config:
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10485760))  # 10MB
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))  # Smaller chunks for better precision
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 100))  # Proportional overlap
+    NEIGHBOR_WINDOW = int(os.getenv("NEIGHBOR_WINDOW", 1))  # chunks added either side of each hit, 0 disables
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))  # prompt tokens for retrieved passages, 0 = unlimited
+    
+    # Sentence-level index linked to parent chunks: exact supporting sentences for previews and, optionally, the prompt
+    SENTENCE_INDEX = os.getenv("SENTENCE_INDEX", "false").lower() == "true"
+    SENTENCES_PER_CHUNK = int(os.getenv("SENTENCES_PER_CHUNK", 2))
+    SENTENCE_CONTEXT = os.getenv("SENTENCE_CONTEXT", "false").lower() == "true"  # send only supporting sentences + neighbors
+    SENTENCE_CONTEXT_WINDOW = int(os.getenv("SENTENCE_CONTEXT_WINDOW", 1))
+    # Extractive compression: keep the sentences of each passage that best match the question, under their headings
+    CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "false").lower() == "true"
+    COMPRESSION_MAX_SENTENCES = int(os.getenv("COMPRESSION_MAX_SENTENCES", 3))
+    
+    # Maximal marginal relevance over the retrieved candidates: 1.0 = relevance only (disabled), lower = more diverse
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+    MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", 20))  # candidates considered before selecting k
+    MIN_SIMILARITY = float(os.getenv("MIN_SIMILARITY", 0.0))  # drop candidates below this 0..1 similarity, 0 keeps all
+    
+    # Adaptive k: keep as many passages as the score gap/elbow suggests, between the bounds. The upper
+    # bound defaults to the fixed k (5), so adaptive k only ever trims the context, never grows it
+    ADAPTIVE_K = os.getenv("ADAPTIVE_K", "true").lower() == "true"
+    ADAPTIVE_K_MIN = int(os.getenv("ADAPTIVE_K_MIN", 2))
+    ADAPTIVE_K_MAX = int(os.getenv("ADAPTIVE_K_MAX", 5))
+    ADAPTIVE_K_MIN_GAP = float(os.getenv("ADAPTIVE_K_MIN_GAP", 0.05))  # smallest similarity drop treated as a cut-off
+    # Side indexes describe one backing store (a Chroma path or server plus a collection), so each store
+    # gets its own directory under STORE_INDEX_ROOT; the *_PATH settings below override a single file
+    STORE_INDEX_ROOT = os.getenv("STORE_INDEX_ROOT", os.path.join(CHROMA_DB_PATH, "stores"))
+    FILE_INDEX_PATH = os.getenv("FILE_INDEX_PATH")  # file -> chunk IDs
+    
+    # HNSW index parameters for the policy_documents collection.
+    # space, M and ef_construction only apply when the collection is created;
+    # ef_search is also applied to existing collections on startup.
+    HNSW_SPACE = os.getenv("HNSW_SPACE", "l2")  # l2, cosine or ip
+    HNSW_M = int(os.getenv("HNSW_M", 16))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 100))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 100))
+    
+    # Index used to serve vector queries: "chroma" (Chroma's HNSW), a local
+    # scalar-quantized flat index, "int8" (4x smaller) or "float16" (2x smaller),
+    # or "ivf", a k-means partitioned index with posting lists on disk
+    INDEX_BACKEND = os.getenv("INDEX_BACKEND", "chroma")
+    QUANTIZED_RESCORE = os.getenv("QUANTIZED_RESCORE", "true").lower() == "true"  # exact float32 re-ranking of top candidates
+    RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", 4))  # candidates fetched per requested result when rescoring
+    IVF_NLIST = int(os.getenv("IVF_NLIST", 0))  # clusters, 0 = about 4 * sqrt(corpus size)
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))  # clusters scanned per query
+    
+    # Two-stage retrieval: shortlist documents by their summary vector, then search only their chunks
+    TWO_STAGE_RETRIEVAL = os.getenv("TWO_STAGE_RETRIEVAL", "true").lower() == "true"
+    DOCUMENT_SHORTLIST_SIZE = int(os.getenv("DOCUMENT_SHORTLIST_SIZE", 3))
+    
+    # Hybrid retrieval: BM25 over the whole corpus fused with vector results by reciprocal rank
+    HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))  # candidates per retriever before fusion
+    RRF_K = int(os.getenv("RRF_K", 60))
+    # Deadline for the query embedding call; past it (or on error) retrieval degrades to BM25 only
+    EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", 2.0))
+    BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH")
+    
+    # Semantic answer cache: reuse the answer to an earlier question whose embedding is this similar
+    ANSWER_CACHE = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 5000))
+    ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH")
+    
+    # Exact prompt -> LLM response cache (hash of model, parameters and messages)
+    LLM_CACHE = os.getenv("LLM_CACHE", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000))
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CHROMA_DB_PATH, "llm_cache.sqlite3"))
+    # Concurrent identical questions (same normalized text, options and corpus version) share one computation
+    REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() == "true"
+    # Retrieval pipeline strategy (see rag_pipeline.STRATEGIES): default, improved, rerank, robust or precision
+    RAG_STRATEGY = os.getenv("RAG_STRATEGY", "default")
+    # Connections kept open in the HTTP pool every OpenAI chat and embedding client of the process shares
+    OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+    
+    # Trigger terms -> chunks always added to matching queries (see pinned_rules.json)
+    PINNED_RULES_PATH = os.getenv("PINNED_RULES_PATH", "./pinned_rules.json")
+    
+    @classmethod
+    def hnsw_collection_metadata(cls) -> dict:
+        """Chroma collection metadata carrying the HNSW parameters"""
+        return {
+            "hnsw:space": cls.HNSW_SPACE,
+            "hnsw:M": cls.HNSW_M,
+            "hnsw:construction_ef": cls.HNSW_EF_CONSTRUCTION,
+            "hnsw:search_ef": cls.HNSW_EF_SEARCH
+        }
+    
+    @classmethod
+    def store_index_paths(cls, location: str, collection_name: str) -> dict:
+        """Side index paths for the store at location (a Chroma directory or server URL) and collection"""
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{location}_{collection_name}").strip("_")[-64:]
+        digest = hashlib.sha1(f"{location}|{collection_name}".encode("utf-8")).hexdigest()[:10]
+        store_dir = os.path.join(cls.STORE_INDEX_ROOT, f"{slug}-{digest}")
+        return {
+            "dir": store_dir,
+            "file_index": cls.FILE_INDEX_PATH or os.path.join(store_dir, "file_chunk_index.json"),
+            "bm25_index": cls.BM25_INDEX_PATH or os.path.join(store_dir, "bm25_index.sqlite3"),
+            "answer_cache": cls.ANSWER_CACHE_PATH or os.path.join(store_dir, "answer_cache.sqlite3")
+        }
     
     # Ensure directories exist
     os.makedirs(CHROMA_DB_PATH, exist_ok=True)
@@ -0,0 +1,81 @@
+import re
+from typing import List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+
+from chunk_terms import keyword_overlap
+from sentence_index import split_sentences
+
+NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*[.)]?|[A-Z][.)]|[IVX]+[.)])\s+[A-Z]")
+PAGE_MARKER = re.compile(r"^--- Page \d+ ---$")
+MAX_HEADER_WORDS = 10
+
+def is_structural_header(line: str) -> bool:
+    """Short heading lines: ALL CAPS, ending in a colon, or numbered ("3.1 Approvals")"""
+    line = line.strip()
+    if not line or PAGE_MARKER.match(line) or len(line.split()) > MAX_HEADER_WORDS:
+        return False
+    if line.endswith((".", "?", "!")) and not NUMBERED_HEADING.match(line):
+        return False
+    return line.isupper() or line.endswith(":") or bool(NUMBERED_HEADING.match(line))
+
+def _units(content: str) -> List[Tuple[str, bool]]:
+    """(text, is_header) pieces of a passage in order: header lines, then the sentences between them"""
+    units: List[Tuple[str, bool]] = []
+    body: List[str] = []
+    for line in content.split("\n"):
+        if is_structural_header(line):
+            units.extend((sentence, False) for sentence in split_sentences("\n".join(body)))
+            body = []
+            units.append((line.strip(), True))
+        else:
+            body.append(line)
+    units.extend((sentence, False) for sentence in split_sentences("\n".join(body)))
+    return units
+
+def compress_passage(content: str, question: str, supporting: Iterable[str] = (), max_sentences: int = 3) -> str:
+    """The passage cut down to the sentences that best match the question, under their headers.
+
+    Sentences are scored by the fraction of question terms they contain, plus
+    one for each sentence the sentence index already matched to the query
+    embedding during retrieval, so no model or API call is made here. The
+    passage is returned unchanged if no sentence matches at all.
+    """
+    units = _units(content)
+    sentences = [i for i, (_, is_header) in enumerate(units) if not is_header]
+    if len(sentences) <= max_sentences:
+        return content
+
+    scores = keyword_overlap(question, [{"content": units[i][0], "metadata": {}} for i in sentences])
+    supporting = set(supporting)
+    scores = scores + np.array([1.0 if units[i][0] in supporting else 0.0 for i in sentences], dtype=np.float32)
+    if not scores.max() > 0:
+        return content
+
+    ranked = np.argsort(-scores, kind="stable")[:max_sentences]
+    keep = {sentences[int(r)] for r in ranked if scores[r] > 0}
+    # Each kept sentence brings the nearest heading above it
+    for i in list(keep):
+        for j in range(i - 1, -1, -1):
+            if units[j][1]:
+                keep.add(j)
+                break
+
+    parts, previous = [], -1
+    for i in sorted(keep):
+        if previous >= 0 and i != previous + 1 and not units[i][1]:
+            parts.append("...")
+        parts.append(units[i][0])
+        previous = i
+    return "\n".join(parts)
+
+def compress_passages(relevant_docs: List[Dict[str, Any]], question: str,
+                      max_sentences: int = 3) -> List[Dict[str, Any]]:
+    """compress_passage applied to each result dict (a merged passage keeps max_sentences per passage in it)"""
+    return [
+        {**doc_info, "content": compress_passage(
+            doc_info["content"], question, doc_info.get("supporting_sentences") or [],
+            max_sentences * doc_info.get("merged_passages", 1)
+        )}
+        for doc_info in relevant_docs
+    ]
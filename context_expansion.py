@@ -0,0 +1,77 @@
+from typing import List, Dict, Any
+
+# Shortest repeat taken as splitter overlap; a shorter match (a letter, a common word) is coincidence
+MIN_OVERLAP_WORDS = 3
+
+def merge_overlapping_text(left: str, right: str, max_overlap: int, min_words: int = MIN_OVERLAP_WORDS) -> str:
+    """Join consecutive chunks, dropping the text the splitter repeated at the start of ``right``.
+
+    The splitter overlaps chunks by whole words, so only a repeat of at least
+    min_words words that starts and ends at a word boundary is dropped;
+    otherwise both texts are kept in full.
+    """
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        overlap = right[:size]
+        if len(overlap.split()) < min_words:
+            break
+        if not left.endswith(overlap):
+            continue
+        starts_word = size == len(left) or left[-size - 1].isspace()
+        ends_word = size == len(right) or right[size].isspace()
+        if starts_word and ends_word:
+            return left + right[size:]
+    return left + "\n" + right
+
+def expand_to_neighbors(results: List[Dict[str, Any]], file_index, collection, window: int = 1,
+                        max_overlap: int = 100) -> List[Dict[str, Any]]:
+    """Grow each hit into a passage covering ``window`` chunks either side of it.
+
+    Hits whose passages overlap or touch in the same file are merged into one
+    passage, which takes the metadata and score of its best-ranked hit and keeps
+    that hit's position in the result order. Hits not in the file index are
+    returned unchanged.
+    """
+    spans: Dict[str, List[list]] = {}
+    passages: List[Any] = []
+    for rank, result in enumerate(results):
+        position = file_index.chunk_position(result.get("chunk_id")) if result.get("chunk_id") else None
+        if position is None:
+            passages.append((rank, result))
+            continue
+        file_key, index = position
+        spans.setdefault(file_key, []).append([index - window, index + window, rank, result])
+
+    merged_spans = []
+    for file_key, file_spans in spans.items():
+        chunk_ids = file_index.get_chunk_ids(file_key)
+        file_spans.sort(key=lambda span: span[0])
+        current = None
+        for start, end, rank, result in file_spans:
+            start, end = max(start, 0), min(end, len(chunk_ids) - 1)
+            if current and start <= current["end"] + 1:
+                current["end"] = max(current["end"], end)
+                if rank < current["rank"]:
+                    current["rank"], current["result"] = rank, result
+            else:
+                current = {"chunk_ids": chunk_ids, "start": start, "end": end, "rank": rank, "result": result}
+                merged_spans.append(current)
+
+    needed = [cid for span in merged_spans for cid in span["chunk_ids"][span["start"]:span["end"] + 1]]
+    texts = {}
+    if needed:
+        rows = collection.get(ids=list(dict.fromkeys(needed)), include=["documents"])
+        texts = dict(zip(rows["ids"], rows["documents"]))
+
+    for span in merged_spans:
+        span_ids = [cid for cid in span["chunk_ids"][span["start"]:span["end"] + 1] if cid in texts]
+        result = span["result"]
+        if len(span_ids) <= 1:
+            passages.append((span["rank"], result))
+            continue
+        content = texts[span_ids[0]]
+        for chunk_id in span_ids[1:]:
+            content = merge_overlapping_text(content, texts[chunk_id], max_overlap)
+        passages.append((span["rank"], {**result, "content": content, "expanded_chunk_ids": span_ids}))
+
+    passages.sort(key=lambda item: item[0])
+    return [passage for _, passage in passages]
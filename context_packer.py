@@ -0,0 +1,147 @@
+from typing import List, Dict, Any, Optional, Tuple
+
+from context_expansion import merge_overlapping_text
+from sentence_index import split_sentences
+
+TOKENIZER_MODEL = "gpt-3.5-turbo"
+# Passages are cut at a sentence boundary to fit the budget only if at least this many tokens remain
+MIN_PARTIAL_TOKENS = 40
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Tokens of text for the chat model (about four characters each if tiktoken cannot load its vocabulary)"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except Exception as e:
+            print(f"Could not load tokenizer, estimating token counts: {str(e)}")
+            _encoding = False
+    if _encoding is False:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def _span(passage: Dict[str, Any], file_index) -> Optional[Tuple[str, int, int]]:
+    """(file, first chunk position, last chunk position) of a passage, or None if it is not in the file index"""
+    if file_index is None:
+        return None
+    positions = [
+        file_index.chunk_position(chunk_id)
+        for chunk_id in passage.get("expanded_chunk_ids") or [passage.get("chunk_id")] if chunk_id
+    ]
+    if not positions or any(position is None for position in positions):
+        return None
+    file_keys = {file_key for file_key, _ in positions}
+    if len(file_keys) != 1:
+        return None
+    indexes = [index for _, index in positions]
+    return file_keys.pop(), min(indexes), max(indexes)
+
+def _merge_adjacent(passages: List[Dict[str, Any]], file_index, max_overlap: int) -> List[Dict[str, Any]]:
+    """Join passages of the same file that overlap or sit next to each other, best score first"""
+    merged: List[Dict[str, Any]] = []
+    spans: List[Optional[Tuple[str, int, int]]] = []
+    seen_content = set()
+    for passage in passages:
+        if passage["content"] in seen_content:
+            continue
+        seen_content.add(passage["content"])
+        span = _span(passage, file_index)
+        target = None
+        if span is not None:
+            for i, other in enumerate(spans):
+                if other and other[0] == span[0] and span[1] <= other[2] + 1 and other[1] <= span[2] + 1:
+                    target = i
+                    break
+        if target is None:
+            merged.append(dict(passage))
+            spans.append(span)
+            continue
+
+        file_key, start, end = spans[target]
+        if start <= span[1] and span[2] <= end:
+            continue  # already covered
+        first, second = (passage, merged[target]) if span[1] < start else (merged[target], passage)
+        # Shared whole chunks are longer than the splitter overlap; allow for them when spans overlap
+        overlap = max_overlap if span[1] > end or span[2] < start else min(len(first["content"]), len(second["content"]))
+        merged[target] = {
+            **merged[target],
+            "content": merge_overlapping_text(first["content"], second["content"], overlap),
+            "supporting_sentences": list(dict.fromkeys(
+                (merged[target].get("supporting_sentences") or []) + (passage.get("supporting_sentences") or [])
+            )),
+            "merged_passages": merged[target].get("merged_passages", 1) + 1
+        }
+        spans[target] = (file_key, min(start, span[1]), max(end, span[2]))
+    return merged
+
+def merge_passages(relevant_docs: List[Dict[str, Any]], file_index=None, max_overlap: int = 100) -> List[Dict[str, Any]]:
+    """Passages best score first, with adjacent or overlapping chunks of the same file joined into one.
+
+    A joined passage keeps the supporting sentences of every passage in it and
+    counts them in ``merged_passages``.
+    """
+    ranked = sorted(relevant_docs, key=lambda doc: doc.get("similarity_score", 0), reverse=True)
+    return _merge_adjacent(ranked, file_index, max_overlap)
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Leading sentences of text that fit in max_tokens"""
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        cost = count_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept) + " ..." if kept else ""
+
+def _source_name(passage: Dict[str, Any]) -> str:
+    return passage.get("source_info", {}).get("file_name", "Unknown Document")
+
+def pack_context(relevant_docs: List[Dict[str, Any]], max_tokens: int, file_index=None,
+                 max_overlap: int = 100) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """Prompt context for the passages within a token budget; returns (context, tokens, sources).
+
+    Passages are taken best score first. Adjacent or overlapping chunks of the
+    same file are merged with the splitter overlap removed, passages from one
+    file share a single source header (section names are left out of it, as
+    they are lines of the passage itself), and passages that do not fit are
+    skipped, except that one may be cut at a sentence boundary to fill the
+    rest of the budget.
+
+    sources lists what the prompt cites, in order: ``source_number`` (the n of
+    its ``[Source n]`` header), ``file_name`` and the ``passages`` packed
+    under it, best first and as they appear in the context.
+
+    Passages that were merged and then cut down must be packed without a
+    file_index: their text no longer covers their chunk spans.
+    """
+    passages = merge_passages(relevant_docs, file_index, max_overlap)
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    used = 0
+    for passage in passages:
+        name = _source_name(passage)
+        header_cost = 0 if name in groups else count_tokens(f"[Source {len(groups) + 1}: {name}] (Relevance: 0.000)\n")
+        cost = header_cost + count_tokens(passage["content"]) + 2
+        if used + cost > max_tokens:
+            remaining = max_tokens - used - header_cost - 2
+            if remaining < MIN_PARTIAL_TOKENS and groups:
+                continue  # a shorter passage further down may still fit
+            content = _truncate_to_tokens(passage["content"], remaining)
+            if content:
+                groups.setdefault(name, []).append({**passage, "content": content})
+            break
+        groups.setdefault(name, []).append(passage)
+        used += cost
+
+    sections, sources = [], []
+    for i, (name, group) in enumerate(groups.items(), 1):
+        best = max(passage.get("similarity_score", 0) for passage in group)
+        body = "\n...\n".join(passage["content"] for passage in group)
+        sections.append(f"[Source {i}: {name}] (Relevance: {best:.3f})\n{body}")
+        sources.append({"source_number": i, "file_name": name, "passages": group})
+    context = "\n\n".join(sections) + ("\n\n" if sections else "")
+    return context, count_tokens(context), sources
@@ -0,0 +1,41 @@
+from typing import List, Optional
+
+import numpy as np
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def mmr_select(candidate_vectors: np.ndarray, k: int, lambda_mult: float = 0.7,
+               query_vector: Optional[np.ndarray] = None, relevance: Optional[np.ndarray] = None) -> List[int]:
+    """Maximal marginal relevance: indexes of k candidates balancing relevance against redundancy.
+
+    Relevance is the cosine similarity to ``query_vector``, or the given
+    ``relevance`` scores (higher is better) when there is no query vector.
+    Each step picks argmax(lambda * relevance - (1 - lambda) * max similarity
+    to the already selected candidates); the running maximum is updated with
+    one matrix-vector product per pick.
+    """
+    vectors = _unit_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    n = vectors.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    elif relevance is None:
+        raise ValueError("mmr_select needs query_vector or relevance")
+    relevance = np.asarray(relevance, dtype=np.float32)
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = vectors @ vectors[selected[0]]
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(max_similarity, vectors @ vectors[pick], out=max_similarity)
+    return selected
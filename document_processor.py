@@ -6,6 +6,8 @@ import PyPDF2
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from config import Config
+from chunk_terms import encode_term_ids
+from metadata_filters import detect_category
 
 class DocumentProcessor:
     def __init__(self):
@@ -43,6 +45,7 @@ class DocumentProcessor:
             "source": file_path,
             "filename": file_name,
             "file_hash": file_hash,
+            "category": self._detect_category(file_name),
             **metadata
         }
         
@@ -63,13 +66,19 @@ class DocumentProcessor:
             chunk_metadata["reference_file"] = ref_info["file_name"]
             chunk_metadata["reference_path"] = ref_info["file_path"]
             chunk_metadata["section_headers"] = ", ".join(ref_info["section_headers"]) if ref_info["section_headers"] else ""
+            chunk_metadata["primary_section"] = ref_info["section_headers"][0] if ref_info["section_headers"] else ""
             chunk_metadata["preview"] = ref_info["preview"][:200]  # Limit preview length
+            chunk_metadata["term_ids"] = encode_term_ids(chunk)  # precomputed for keyword reranking
             
             doc = Document(page_content=chunk, metadata=chunk_metadata)
             documents.append(doc)
         
         return documents
     
+    def _detect_category(self, file_name: str) -> str:
+        """Derive a policy category from the file name prefix (A.01.06 -> A, ALL - ... -> ALL)"""
+        return detect_category(file_name)
+    
     def _calculate_file_hash(self, file_path: str) -> str:
         """Calculate hash of file for tracking changes"""
         hash_md5 = hashlib.md5()
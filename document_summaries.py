@@ -0,0 +1,83 @@
+import re
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from chunk_index import FileChunkIndex
+
+SUMMARY_COLLECTION_NAME = "policy_document_summaries"
+MAX_SECTIONS = 20
+SUMMARY_CHARS = 1500
+
+def build_document_summary(file_documents: List[Document]) -> str:
+    """Text representing a whole file: its title, detected sections and opening text"""
+    metadata = file_documents[0].metadata
+    file_name = metadata.get("reference_file") or metadata.get("filename") or ""
+    # "A.01.06 Client referral policy.pdf" -> "Client referral policy"
+    title = re.sub(r"^[A-Z]\.\d{2}(\.\d{2})*\s*", "", Path(file_name).stem).strip(" -_")
+
+    sections = []
+    for doc in file_documents:
+        for header in (doc.metadata.get("section_headers") or "").split(","):
+            header = header.strip()
+            if header and header not in sections:
+                sections.append(header)
+
+    opening = ""
+    for doc in file_documents:
+        opening += re.sub(r"--- Page \d+ ---", " ", doc.page_content) + " "
+        if len(opening) >= SUMMARY_CHARS:
+            break
+    opening = re.sub(r"\s+", " ", opening).strip()[:SUMMARY_CHARS]
+
+    parts = [f"Title: {title or file_name}"]
+    if sections:
+        parts.append("Sections: " + "; ".join(sections[:MAX_SECTIONS]))
+    parts.append("Summary: " + opening)
+    return "\n".join(parts)
+
+class DocumentSummaryIndex:
+    """One vector per file, used to shortlist documents before searching chunks"""
+
+    def __init__(self, chroma_client, embeddings, collection_metadata: Optional[Dict[str, Any]] = None):
+        self.chroma_client = chroma_client
+        self.vectorstore = Chroma(
+            client=chroma_client,
+            collection_name=SUMMARY_COLLECTION_NAME,
+            embedding_function=embeddings,
+            collection_metadata=collection_metadata
+        )
+
+    def count(self) -> int:
+        return self.chroma_client.get_collection(name=SUMMARY_COLLECTION_NAME).count()
+
+    def upsert(self, file_documents: List[Document]):
+        """Embed and store the summary of one file's chunks"""
+        metadata = file_documents[0].metadata
+        source = metadata.get("source") or metadata.get("filename")
+        file_key = FileChunkIndex.file_key(source)
+        self.vectorstore.add_texts(
+            texts=[build_document_summary(file_documents)],
+            metadatas=[{
+                "reference_file": metadata.get("reference_file") or file_key,
+                "file_key": file_key,
+                "total_chunks": len(file_documents)
+            }],
+            ids=[file_key]
+        )
+
+    def delete(self, file_path: str):
+        self.vectorstore.delete(ids=[FileChunkIndex.file_key(file_path)])
+
+    def clear(self):
+        collection = self.chroma_client.get_collection(name=SUMMARY_COLLECTION_NAME)
+        ids = collection.get(include=[])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+
+    def shortlist(self, query_vector: List[float], n: int) -> List[str]:
+        """File names of the n documents closest to the query"""
+        results = self.vectorstore.similarity_search_by_vector_with_relevance_scores(query_vector, k=n)
+        return [doc.metadata.get("reference_file") for doc, _ in results if doc.metadata.get("reference_file")]
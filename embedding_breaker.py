@@ -0,0 +1,91 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable
+
+# How long embedding is skipped after a call times out or fails
+FAILED_EMBEDDING_TTL = 30.0
+# Concurrent embedding calls; a call is refused rather than queued behind abandoned ones
+EMBEDDING_WORKERS = 4
+
+class EmbeddingUnavailable(Exception):
+    """Raised instead of calling the embedding API while it is considered degraded"""
+
+class EmbeddingBreaker:
+    """Process-wide circuit breaker for the embedding API.
+
+    After a call times out or fails, every caller skips embedding for ``ttl``
+    seconds and goes straight to lexical retrieval instead of waiting out its
+    own deadline. The first call after that window probes the API (others keep
+    skipping until it returns). Sync calls run on a small worker pool; a call
+    that misses its deadline keeps its worker until the HTTP request ends, so
+    when every worker is taken new calls are refused instead of queued.
+    """
+
+    def __init__(self, ttl: float = FAILED_EMBEDDING_TTL, workers: int = EMBEDDING_WORKERS):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-embedding")
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self._open_until = 0.0
+        self._probing = False
+
+    def _acquire(self):
+        with self._lock:
+            now = time.time()
+            if now < self._open_until:
+                raise EmbeddingUnavailable(f"embedding API degraded, retrying in {self._open_until - now:.0f}s")
+            if self._open_until:
+                if self._probing:
+                    raise EmbeddingUnavailable("embedding API degraded, probe in flight")
+                self._probing = True
+
+    def _release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def _record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            self._open_until = 0.0 if ok else time.time() + self.ttl
+
+    def call(self, fn: Callable[..., Any], *args, timeout: float) -> Any:
+        """fn(*args) under the deadline; raises on timeout, failure or an open breaker"""
+        self._acquire()
+        if not self._slots.acquire(blocking=False):
+            self._release_probe()
+            raise EmbeddingUnavailable("every embedding worker is busy with an earlier call")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            self._release_probe()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._record(False)
+            raise
+        except Exception:
+            self._record(False)
+            raise
+        self._record(True)
+        return result
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args, timeout: float) -> Any:
+        """await fn(*args) under the deadline; raises on timeout, failure or an open breaker"""
+        self._acquire()
+        try:
+            result = await asyncio.wait_for(fn(*args), timeout)
+        except asyncio.CancelledError:
+            # The caller went away: neither a success nor a failure of the API
+            self._release_probe()
+            raise
+        except Exception:
+            self._record(False)
+            raise
+        self._record(True)
+        return result
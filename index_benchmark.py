@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Recall/latency tuning harness for the policy_documents index
+Sweeps HNSW parameters, quantized and IVF local index modes against exact
+brute-force ground truth computed from the stored embeddings and reports
+recall@k, p50/p99 query latency, and for every backend alike the bytes on
+disk and the resident memory a fresh process gains by opening the saved index
+and serving the queries.
+"""
+
+import os
+import time
+import json
+import shutil
+import argparse
+import tempfile
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any
+
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+
+from config import Config
+from quantized_index import QuantizedIndex, exact_distances, directory_size
+from ivf_index import IVFIndex
+from local_index import open_local_index
+
+def load_corpus(db_path: str, collection_name: str = "policy_documents") -> Dict[str, Any]:
+    """Load IDs and embeddings from the configured local index, or from the persistent collection"""
+    local_index = open_local_index(Config, Config.store_index_paths(os.path.abspath(db_path), collection_name)["dir"])
+    if local_index is not None and len(local_index):
+        ids, embeddings = local_index.vectors(local_index.chunk_ids())
+        return {"ids": ids, "embeddings": embeddings}
+    client = chromadb.PersistentClient(path=db_path, settings=Settings(anonymized_telemetry=False))
+    collection = client.get_collection(name=collection_name)
+    data = collection.get(include=["embeddings"])
+    return {
+        "ids": list(data["ids"]),
+        "embeddings": np.asarray(data["embeddings"], dtype=np.float32)
+    }
+
+def load_queries(corpus: Dict[str, Any], questions_file: str = None, sample: int = 200, seed: int = 42) -> np.ndarray:
+    """Query vectors: embedded eval questions if given, otherwise a sample of stored chunk vectors"""
+    if questions_file:
+        from langchain_openai import OpenAIEmbeddings
+        with open(questions_file, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        embeddings = OpenAIEmbeddings(openai_api_key=Config.OPENAI_API_KEY)
+        return np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    count = min(sample, len(corpus["ids"]))
+    picks = rng.choice(len(corpus["ids"]), size=count, replace=False)
+    return corpus["embeddings"][picks]
+
+def exact_neighbors(embeddings: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Brute-force top-k row indices under the given Chroma distance space"""
+    if space == "cosine":
+        doc_norm = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        query_norm = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        distances = 1.0 - query_norm @ doc_norm.T
+    elif space == "ip":
+        distances = 1.0 - queries @ embeddings.T
+    else:
+        distances = (
+            np.sum(queries ** 2, axis=1, keepdims=True)
+            - 2.0 * queries @ embeddings.T
+            + np.sum(embeddings ** 2, axis=1)
+        )
+    k = min(k, embeddings.shape[0])
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+def rss_bytes() -> int:
+    """Resident set size of this process (from /proc, or the peak from getrusage elsewhere)"""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _serve_queries(backend: str, work_dir: str, options: Dict[str, Any], queries: np.ndarray, k: int) -> int:
+    """Child process body for resident_bytes: open the saved index, run the queries, report the RSS growth"""
+    if backend == "hnsw":
+        # The client itself is not part of the index; Chroma loads the HNSW when the collection is first used
+        client = chromadb.PersistentClient(path=work_dir, settings=Settings(anonymized_telemetry=False))
+        before = rss_bytes()
+        collection = client.get_collection(name="hnsw_benchmark")
+        search = lambda query: collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+    elif backend == "ivf":
+        before = rss_bytes()
+        index = IVFIndex.load(work_dir, space=options["space"])
+        search = lambda query: index.search(query, k, nprobe=options["nprobe"])
+    else:
+        before = rss_bytes()
+        index = QuantizedIndex.load(work_dir, dtype=backend, space=options["space"])
+        if options["rescore"]:
+            search = lambda query: index.vectors([chunk_id for chunk_id, _ in index.search(query, k * options["rescore_factor"])])
+        else:
+            search = lambda query: index.search(query, k)
+    for query in queries:
+        search(query)
+    return rss_bytes() - before
+
+def resident_bytes(backend: str, work_dir: str, options: Dict[str, Any], queries: np.ndarray, k: int) -> int:
+    """Memory a fresh process gains by opening the index saved in work_dir and serving the queries.
+
+    Measured the same way for every backend, so Chroma's HNSW (loaded whole)
+    compares fairly with local indexes that keep part of their data on disk.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_serve_queries, backend, work_dir, options, queries, k).result()
+
+def percentile_ms(latencies: List[float], pct: float) -> float:
+    return float(np.percentile(np.asarray(latencies) * 1000.0, pct))
+
+def recall_at_k(retrieved: List[List[int]], truth: np.ndarray) -> float:
+    """Mean fraction of the exact top-k found by the index"""
+    hits = [len(set(found) & set(expected)) / len(expected) for found, expected in zip(retrieved, truth.tolist())]
+    return float(np.mean(hits)) if hits else 0.0
+
+def benchmark_hnsw(corpus: Dict[str, Any], queries: np.ndarray, k: int, space: str, m: int,
+                   ef_construction: int, ef_search: int, batch_size: int = 1000) -> Dict[str, Any]:
+    """Build a throwaway collection with the given parameters and measure it"""
+    work_dir = tempfile.mkdtemp(prefix="hnsw_bench_")
+    try:
+        client = chromadb.PersistentClient(path=work_dir, settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection(
+            name="hnsw_benchmark",
+            metadata={
+                "hnsw:space": space,
+                "hnsw:M": m,
+                "hnsw:construction_ef": ef_construction,
+                "hnsw:search_ef": ef_search
+            }
+        )
+
+        build_start = time.perf_counter()
+        ids = corpus["ids"]
+        embeddings = corpus["embeddings"]
+        for start in range(0, len(ids), batch_size):
+            collection.add(ids=ids[start:start + batch_size], embeddings=embeddings[start:start + batch_size].tolist())
+        build_seconds = time.perf_counter() - build_start
+
+        position = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        latencies, retrieved = [], []
+        for query in queries:
+            query_start = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+            latencies.append(time.perf_counter() - query_start)
+            retrieved.append([position[chunk_id] for chunk_id in result["ids"][0]])
+
+        truth = exact_neighbors(embeddings, queries, k, space)
+        del collection, client
+        return {
+            "backend": "hnsw",
+            "space": space,
+            "M": m,
+            "ef_construction": ef_construction,
+            "ef_search": ef_search,
+            f"recall@{k}": round(recall_at_k(retrieved, truth), 4),
+            "p50_ms": round(percentile_ms(latencies, 50), 3),
+            "p99_ms": round(percentile_ms(latencies, 99), 3),
+            "build_s": round(build_seconds, 2),
+            "disk_bytes": directory_size(work_dir),
+            "resident_bytes": resident_bytes("hnsw", work_dir, {}, queries, k)
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def benchmark_quantized(corpus: Dict[str, Any], queries: np.ndarray, k: int, space: str, dtype: str,
+                        rescore: bool, rescore_factor: int, ingest_batch: int = 0) -> Dict[str, Any]:
+    """Measure a quantized flat index, optionally with exact float32 rescoring of the top candidates.
+
+    With ingest_batch the index is filled by add() calls of that many vectors,
+    as file-by-file ingest does, instead of one build() over the corpus.
+    """
+    ids = corpus["ids"]
+    embeddings = corpus["embeddings"]
+    work_dir = tempfile.mkdtemp(prefix="quantized_bench_")
+    try:
+        index = QuantizedIndex(work_dir, dtype=dtype, space=space)
+
+        build_start = time.perf_counter()
+        if ingest_batch:
+            for start in range(0, len(ids), ingest_batch):
+                index.add(ids[start:start + ingest_batch], embeddings[start:start + ingest_batch])
+        else:
+            index.build(ids, embeddings)
+        index.save()
+        build_seconds = time.perf_counter() - build_start
+
+        position = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        latencies, retrieved = [], []
+        for query in queries:
+            query_start = time.perf_counter()
+            candidates = index.search(query, k * rescore_factor if rescore else k)
+            found = [chunk_id for chunk_id, _ in candidates]
+            if rescore and found:
+                # Rescore from the on-disk float32 vectors, as local_index_search does
+                found, vectors = index.vectors(found)
+                found = [found[i] for i in np.argsort(exact_distances(query, vectors, space))]
+            latencies.append(time.perf_counter() - query_start)
+            retrieved.append([position[chunk_id] for chunk_id in found[:k]])
+        disk_bytes = index.disk_bytes()
+        memory = resident_bytes(dtype, work_dir, {"space": space, "rescore": rescore, "rescore_factor": rescore_factor},
+                                queries, k)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    truth = exact_neighbors(embeddings, queries, k, space)
+    return {
+        "backend": dtype + ("+incremental" if ingest_batch else "") + ("+rescore" if rescore else ""),
+        "space": space,
+        "M": "",
+        "ef_construction": "",
+        "ef_search": "",
+        f"recall@{k}": round(recall_at_k(retrieved, truth), 4),
+        "p50_ms": round(percentile_ms(latencies, 50), 3),
+        "p99_ms": round(percentile_ms(latencies, 99), 3),
+        "build_s": round(build_seconds, 2),
+        "disk_bytes": disk_bytes,
+        "resident_bytes": memory
+    }
+
+def benchmark_ivf(corpus: Dict[str, Any], queries: np.ndarray, k: int, space: str, n_lists: int,
+                  nprobes: List[int]) -> List[Dict[str, Any]]:
+    """Build one IVF index and measure it at each nprobe"""
+    work_dir = tempfile.mkdtemp(prefix="ivf_bench_")
+    try:
+        index = IVFIndex(work_dir, space=space, n_lists=n_lists)
+        build_start = time.perf_counter()
+        index.build(corpus["ids"], corpus["embeddings"])
+        build_seconds = time.perf_counter() - build_start
+
+        position = {chunk_id: i for i, chunk_id in enumerate(corpus["ids"])}
+        truth = exact_neighbors(corpus["embeddings"], queries, k, space)
+        rows = []
+        for nprobe in nprobes:
+            latencies, retrieved = [], []
+            for query in queries:
+                query_start = time.perf_counter()
+                hits = index.search(query, k, nprobe=nprobe)
+                latencies.append(time.perf_counter() - query_start)
+                retrieved.append([position[chunk_id] for chunk_id, _ in hits])
+            rows.append({
+                "backend": f"ivf({len(index.centroids)} lists, nprobe={nprobe})",
+                "space": space,
+                "M": "",
+                "ef_construction": "",
+                "ef_search": "",
+                f"recall@{k}": round(recall_at_k(retrieved, truth), 4),
+                "p50_ms": round(percentile_ms(latencies, 50), 3),
+                "p99_ms": round(percentile_ms(latencies, 99), 3),
+                "build_s": round(build_seconds, 2),
+                "disk_bytes": index.disk_bytes(),
+                "resident_bytes": resident_bytes("ivf", work_dir, {"space": space, "nprobe": nprobe}, queries, k)
+            })
+        return rows
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def print_table(rows: List[Dict[str, Any]]):
+    if not rows:
+        print("No results")
+        return
+    headers = list(rows[0].keys())
+    widths = {h: max(len(h), *(len(str(row.get(h, ""))) for row in rows)) for h in headers}
+    print("  ".join(h.ljust(widths[h]) for h in headers))
+    for row in rows:
+        print("  ".join(str(row.get(h, "")).ljust(widths[h]) for h in headers))
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep index parameters against brute-force ground truth")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query (recall@k)")
+    parser.add_argument("--space", default=Config.HNSW_SPACE, help="Comma-separated distance spaces (l2,cosine,ip)")
+    parser.add_argument("--m", default=str(Config.HNSW_M), help="Comma-separated M values")
+    parser.add_argument("--ef-construction", default=str(Config.HNSW_EF_CONSTRUCTION), help="Comma-separated ef_construction values")
+    parser.add_argument("--ef-search", default="10,50,100,200", help="Comma-separated ef_search values")
+    parser.add_argument("--quantized", default="int8,float16", help="Comma-separated quantized modes to compare (empty to skip)")
+    parser.add_argument("--ingest-batch", type=int, default=20,
+                        help="Vectors per add() in the incremental-ingest case of the quantized modes, 0 to skip it")
+    parser.add_argument("--rescore-factor", type=int, default=Config.RESCORE_FACTOR, help="Candidates per result for float32 rescoring")
+    parser.add_argument("--ivf-nprobe", default="1,4,8,16", help="Comma-separated nprobe values for the IVF index (empty to skip)")
+    parser.add_argument("--ivf-nlist", type=int, default=Config.IVF_NLIST, help="IVF clusters, 0 = about 4 * sqrt(corpus size)")
+    parser.add_argument("--questions", help="File with one eval question per line (embedded via OpenAI)")
+    parser.add_argument("--sample", type=int, default=200, help="Stored vectors to use as queries when --questions is not given")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    print(f"Loading corpus from {Config.CHROMA_DB_PATH}...")
+    corpus = load_corpus(Config.CHROMA_DB_PATH)
+    if not corpus["ids"]:
+        print("❌ Collection is empty, nothing to benchmark")
+        return
+    queries = load_queries(corpus, args.questions, args.sample)
+    print(f"Corpus: {len(corpus['ids'])} vectors x {corpus['embeddings'].shape[1]} dims, {len(queries)} queries")
+
+    rows = []
+    grid = itertools.product(
+        [s.strip() for s in args.space.split(",") if s.strip()],
+        parse_int_list(args.m),
+        parse_int_list(args.ef_construction),
+        parse_int_list(args.ef_search)
+    )
+    for space, m, ef_construction, ef_search in grid:
+        print(f"  space={space} M={m} ef_construction={ef_construction} ef_search={ef_search}")
+        rows.append(benchmark_hnsw(corpus, queries, args.k, space, m, ef_construction, ef_search))
+
+    for space in [s.strip() for s in args.space.split(",") if s.strip()]:
+        for dtype in [d.strip() for d in args.quantized.split(",") if d.strip()]:
+            for ingest_batch, rescore in itertools.product(sorted({0, args.ingest_batch}), (False, True)):
+                print(f"  space={space} {dtype} rescore={rescore} ingest_batch={ingest_batch or 'build'}")
+                rows.append(benchmark_quantized(
+                    corpus, queries, args.k, space, dtype, rescore, args.rescore_factor, ingest_batch
+                ))
+
+        if parse_int_list(args.ivf_nprobe):
+            print(f"  space={space} ivf nprobe={args.ivf_nprobe}")
+            rows.extend(benchmark_ivf(corpus, queries, args.k, space, args.ivf_nlist, parse_int_list(args.ivf_nprobe)))
+
+    print(f"\nfloat32 vectors: {corpus['embeddings'].nbytes} bytes")
+    print_table(rows)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == "__main__":
+    main()
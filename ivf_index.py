@@ -0,0 +1,237 @@
+import os
+import math
+import sqlite3
+import threading
+from typing import List, Optional, Tuple, Iterable
+
+import numpy as np
+
+from quantized_index import exact_distances, directory_size, read_vectors, rows_to_vectors
+
+# Vectors used to train the k-means centroids, bounds memory during (re)training
+TRAIN_SAMPLE_SIZE = 16384
+KMEANS_ITERATIONS = 20
+# Retrain once the index has grown this many times past the size it was trained on
+RETRAIN_GROWTH = 4.0
+# Allowed-ID sets up to this size are scanned exactly instead of probing clusters
+EXACT_SCAN_LIMIT = 20000
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = KMEANS_ITERATIONS, seed: int = 42) -> np.ndarray:
+    """Lloyd's k-means returning float32 centroids"""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, min(n_clusters, vectors.shape[0]))
+    centroids = vectors[rng.choice(vectors.shape[0], size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_to_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters).astype(np.float32)
+        empty = counts == 0
+        centroids = np.where(empty[:, None], centroids, sums / np.maximum(counts, 1.0)[:, None])
+        if empty.any():
+            # Re-seed empty clusters with random points so every list stays useful
+            centroids[empty] = vectors[rng.choice(vectors.shape[0], size=int(empty.sum()), replace=False)]
+    return centroids.astype(np.float32)
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray, block_rows: int = 8192) -> np.ndarray:
+    """Index of the nearest centroid (squared L2) for each vector"""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block_rows):
+        block = vectors[start:start + block_rows]
+        distances = centroid_norms - 2.0 * block @ centroids.T
+        assignments[start:start + block_rows] = np.argmin(distances, axis=1)
+    return assignments
+
+class IVFIndex:
+    """Clustered inverted-file index with posting lists on disk.
+
+    Only the k-means centroids live in memory. Each vector is stored in a
+    SQLite table keyed by its cluster, and a query reads the ``nprobe``
+    clusters nearest to it, so query cost depends on cluster size rather than
+    corpus size.
+    """
+
+    needs_rescore = False  # posting lists hold exact float32 vectors
+
+    def __init__(self, index_dir: str, space: str = "l2", n_lists: int = 0, nprobe: int = 8):
+        self.index_dir = index_dir
+        self.space = space
+        self.requested_lists = n_lists
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_count = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(index_dir, "postings.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings (chunk_id TEXT PRIMARY KEY, list_id INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS postings_list ON postings (list_id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._load_centroids()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+
+    def _load_centroids(self):
+        path = os.path.join(self.index_dir, "centroids.npy")
+        # Centroids are trained and assigned by L2 whatever the space, so a space change only changes scoring
+        self._db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('space', ?)", (self.space,))
+        self._db.commit()
+        if os.path.exists(path):
+            self.centroids = np.load(path)
+            row = self._db.execute("SELECT value FROM settings WHERE key = 'trained_count'").fetchone()
+            self.trained_count = int(row[0]) if row else len(self)
+
+    def _list_count(self, total: int) -> int:
+        if self.requested_lists:
+            return self.requested_lists
+        # Roughly 4 * sqrt(N) lists keeps both centroid scan and list scan small
+        return max(1, int(4 * math.sqrt(max(total, 1))))
+
+    def _train(self, sample: np.ndarray, total: int):
+        self.centroids = kmeans(sample, min(self._list_count(total), sample.shape[0]))
+        self.trained_count = total
+        np.save(os.path.join(self.index_dir, "centroids.npy"), self.centroids)
+        self._db.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", [
+            ("space", self.space), ("trained_count", str(total))
+        ])
+
+    def _insert(self, ids: List[str], embeddings: np.ndarray):
+        assignments = assign_to_centroids(embeddings, self.centroids)
+        self._db.executemany(
+            "INSERT OR REPLACE INTO postings (chunk_id, list_id, vector) VALUES (?, ?, ?)",
+            [(chunk_id, int(list_id), vector.tobytes()) for chunk_id, list_id, vector in zip(ids, assignments, embeddings)]
+        )
+
+    # Maintenance
+
+    def build(self, ids: List[str], embeddings: np.ndarray):
+        """Replace the index contents, training centroids on a sample of the vectors"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self._db.execute("DELETE FROM postings")
+            if len(ids):
+                rng = np.random.default_rng(42)
+                picks = rng.choice(len(ids), size=min(TRAIN_SAMPLE_SIZE, len(ids)), replace=False)
+                self._train(embeddings[picks], len(ids))
+                self._insert(list(ids), embeddings)
+            self._db.commit()
+
+    def add(self, ids: List[str], embeddings: np.ndarray):
+        """Insert or overwrite vectors, retraining when the corpus has outgrown the centroids"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.centroids is None:
+                self.build(ids, embeddings)
+                return
+            self._insert(list(ids), embeddings)
+            self._db.commit()
+            if len(self) > RETRAIN_GROWTH * max(self.trained_count, 1):
+                self.retrain()
+
+    def retrain(self):
+        """Re-fit centroids on a sample of stored vectors and reassign every posting"""
+        with self._lock:
+            total = len(self)
+            if not total:
+                return
+            rows = self._db.execute(
+                "SELECT vector FROM postings ORDER BY RANDOM() LIMIT ?", (TRAIN_SAMPLE_SIZE,)
+            ).fetchall()
+            self._train(np.vstack([np.frombuffer(row[0], dtype=np.float32) for row in rows]), total)
+
+            # Reassign in batches so the corpus is never loaded at once
+            cursor = self._db.execute("SELECT chunk_id, vector FROM postings")
+            updates = []
+            while True:
+                batch = cursor.fetchmany(8192)
+                if not batch:
+                    break
+                vectors = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in batch])
+                assignments = assign_to_centroids(vectors, self.centroids)
+                updates.extend((int(list_id), row[0]) for list_id, row in zip(assignments, batch))
+            self._db.executemany("UPDATE postings SET list_id = ? WHERE chunk_id = ?", updates)
+            self._db.commit()
+            print(f"Retrained IVF index: {len(self.centroids)} lists over {total} vectors")
+
+    def remove(self, ids: Iterable[str]):
+        ids = list(ids)
+        with self._lock:
+            self._db.executemany("DELETE FROM postings WHERE chunk_id = ?", [(chunk_id,) for chunk_id in ids])
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM postings")
+            self._db.commit()
+            self.centroids = None
+            self.trained_count = 0
+            path = os.path.join(self.index_dir, "centroids.npy")
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save(self):
+        """Postings are committed as they change; kept for interface parity with QuantizedIndex"""
+        with self._lock:
+            self._db.commit()
+
+    # Search
+
+    def _fetch_rows(self, query: str, params: list) -> Tuple[List[str], np.ndarray]:
+        return rows_to_vectors(self._db.execute(query, params).fetchall())
+
+    def search(self, query: List[float], k: int, allowed_ids: Optional[Iterable[str]] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top-k (id, distance) pairs from the nprobe nearest clusters, or an exact scan of allowed_ids"""
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self.centroids is None:
+                return []
+            allowed = list(allowed_ids) if allowed_ids is not None else None
+            if allowed is not None and len(allowed) <= EXACT_SCAN_LIMIT:
+                ids, vectors = self.vectors(allowed)
+            else:
+                probe = min(nprobe or self.nprobe, len(self.centroids))
+                centroid_distances = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2.0 * self.centroids @ query
+                lists = np.argpartition(centroid_distances, probe - 1)[:probe].tolist()
+                ids, vectors = self._fetch_rows(
+                    f"SELECT chunk_id, vector FROM postings WHERE list_id IN ({','.join('?' * len(lists))})", lists
+                )
+                if allowed is not None and ids:
+                    allowed_set = set(allowed)
+                    keep = [i for i, chunk_id in enumerate(ids) if chunk_id in allowed_set]
+                    ids, vectors = [ids[i] for i in keep], vectors[keep]
+
+        if not ids:
+            return []
+        distances = exact_distances(query, vectors, self.space)
+        k = min(k, len(ids))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(ids[int(i)], float(distances[int(i)])) for i in top]
+
+    def chunk_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT chunk_id FROM postings")]
+
+    def vectors(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Exact float32 vectors of the given chunks that are indexed, read from the posting lists"""
+        with self._lock:
+            return read_vectors(self._db, "SELECT chunk_id, vector FROM postings WHERE chunk_id IN ({})", ids)
+
+    def memory_bytes(self) -> int:
+        """Bytes of the in-memory centroids (posting lists stay on disk, see disk_bytes)"""
+        return self.centroids.nbytes if self.centroids is not None else 0
+
+    def disk_bytes(self) -> int:
+        """Bytes on disk: the posting lists with their float32 vectors, and the centroids"""
+        return directory_size(self.index_dir)
+
+    @classmethod
+    def load(cls, index_dir: str, space: str = "l2", n_lists: int = 0, nprobe: int = 8) -> "IVFIndex":
+        return cls(index_dir, space=space, n_lists=n_lists, nprobe=nprobe)
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Generator, AsyncGenerator
+
+from langchain_core.messages import BaseMessage
+
+class LLMResponseCache:
+    """LLM responses keyed on the exact prompt.
+
+    The key is a SHA-256 of the model, its generation parameters and every
+    message (role and content), so a hit is only ever served for a call that
+    would have been sent to the API byte for byte. Entries live in SQLite,
+    shared by every RAG variant and process using the same path, and the
+    least recently used ones are dropped past ``max_entries``.
+    """
+
+    def __init__(self, cache_path: str, max_entries: int = 10000):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def model_params(llm) -> Dict[str, Any]:
+        """Everything about the model that changes its output (streaming does not)"""
+        params = dict(getattr(llm, "_identifying_params", {}) or {})
+        params.pop("stream", None)
+        params.pop("streaming", None)
+        params["_type"] = getattr(llm, "_llm_type", type(llm).__name__)
+        return params
+
+    @classmethod
+    def key(cls, llm, messages: List[BaseMessage]) -> str:
+        payload = {
+            "model": cls.model_params(llm),
+            "messages": [[message.type, message.content] for message in messages]
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = ""):
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                # Trim to 90% so eviction is occasional
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                    (int(self.max_entries * 0.9),)
+                )
+            self._db.commit()
+
+    def invoke(self, llm, messages: List[BaseMessage], use_cache: bool = True) -> str:
+        """``llm.invoke(messages).content``, served from the cache when the same prompt was answered.
+
+        With ``use_cache=False`` the model is always called and its answer
+        replaces the cached one.
+        """
+        key = self.key(llm, messages)
+        if use_cache:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+        answer = llm.invoke(messages).content
+        self._store(key, llm, answer)
+        return answer
+
+    async def ainvoke(self, llm, messages: List[BaseMessage], use_cache: bool = True) -> str:
+        """invoke through ``llm.ainvoke``; the SQLite reads and writes run in a worker thread"""
+        key = self.key(llm, messages)
+        if use_cache:
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                return cached
+        answer = (await llm.ainvoke(messages)).content
+        await asyncio.to_thread(self._store, key, llm, answer)
+        return answer
+
+    def stream(self, llm, messages: List[BaseMessage], use_cache: bool = True) -> Generator[str, None, None]:
+        """Content pieces of ``llm.stream(messages)``; a cached answer comes back as one piece.
+
+        The answer is only cached once the stream has run to the end.
+        """
+        key = self.key(llm, messages)
+        if use_cache:
+            cached = self.get(key)
+            if cached is not None:
+                yield cached
+                return
+        pieces = []
+        for chunk in llm.stream(messages):
+            if hasattr(chunk, 'content') and chunk.content:
+                pieces.append(chunk.content)
+                yield chunk.content
+        self._store(key, llm, "".join(pieces))
+
+    async def astream(self, llm, messages: List[BaseMessage], use_cache: bool = True) -> AsyncGenerator[str, None]:
+        """stream through ``llm.astream``, so each token read awaits instead of blocking"""
+        key = self.key(llm, messages)
+        if use_cache:
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                yield cached
+                return
+        pieces = []
+        async for chunk in llm.astream(messages):
+            if hasattr(chunk, 'content') and chunk.content:
+                pieces.append(chunk.content)
+                yield chunk.content
+        await asyncio.to_thread(self._store, key, llm, "".join(pieces))
+
+    def _store(self, key: str, llm, answer: str):
+        if not answer:
+            return
+        try:
+            params = self.model_params(llm)
+            self.put(key, answer, str(params.get("model_name") or params.get("model") or params["_type"]))
+        except Exception as e:
+            print(f"Error caching LLM response: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+def invoke_llm(llm, messages: List[BaseMessage], cache: Optional[LLMResponseCache] = None,
+               use_cache: bool = True) -> str:
+    """Answer text for the messages, through the prompt cache when one is configured"""
+    if cache is None:
+        return llm.invoke(messages).content
+    return cache.invoke(llm, messages, use_cache)
+
+async def ainvoke_llm(llm, messages: List[BaseMessage], cache: Optional[LLMResponseCache] = None,
+                     use_cache: bool = True) -> str:
+    """invoke_llm without blocking the event loop"""
+    if cache is None:
+        return (await llm.ainvoke(messages)).content
+    return await cache.ainvoke(llm, messages, use_cache)
+
+def stream_llm(llm, messages: List[BaseMessage], cache: Optional[LLMResponseCache] = None,
+               use_cache: bool = True) -> Generator[str, None, None]:
+    """Answer text pieces for the messages, through the prompt cache when one is configured"""
+    if cache is None:
+        for chunk in llm.stream(messages):
+            if hasattr(chunk, 'content') and chunk.content:
+                yield chunk.content
+        return
+    yield from cache.stream(llm, messages, use_cache)
+
+async def astream_llm(llm, messages: List[BaseMessage], cache: Optional[LLMResponseCache] = None,
+                      use_cache: bool = True) -> AsyncGenerator[str, None]:
+    """stream_llm without blocking the event loop"""
+    if cache is None:
+        async for chunk in llm.astream(messages):
+            if hasattr(chunk, 'content') and chunk.content:
+                yield chunk.content
+        return
+    async for content in cache.astream(llm, messages, use_cache):
+        yield content
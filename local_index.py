@@ -0,0 +1,191 @@
+import os
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from quantized_index import QuantizedIndex, exact_distances
+from ivf_index import IVFIndex
+
+# Index backends served from a local index instead of Chroma's HNSW.
+# With these, Chroma stores text and metadata in a records collection whose
+# embeddings are one-dimensional placeholders, so it never builds or loads an
+# HNSW of the real vectors; the local index keeps the only float32 copy, on disk.
+QUANTIZED_BACKENDS = ("int8", "float16")
+RECORDS_SUFFIX = "_records"
+PLACEHOLDER_EMBEDDING = [0.0]
+
+def collection_space(collection, default: str = "l2") -> str:
+    """Distance space a Chroma collection was created with (HNSW settings are fixed at creation)"""
+    try:
+        space = ((collection.configuration or {}).get("hnsw") or {}).get("space")
+        if space:
+            return space
+    except Exception:
+        # Older Chroma releases only keep HNSW settings in the collection metadata
+        pass
+    return (collection.metadata or {}).get("hnsw:space", default)
+
+def open_local_index(config, store_dir: str, space: Optional[str] = None):
+    """Load the configured local index from a store's side index directory, or None when Chroma serves queries.
+
+    space is the distance space of the stored collection (HNSW_SPACE for a new store).
+    """
+    backend = config.INDEX_BACKEND
+    if backend == "chroma":
+        return None
+    space = space or config.HNSW_SPACE
+    index_dir = os.path.join(store_dir, f"{backend}_index")
+    if backend in QUANTIZED_BACKENDS:
+        return QuantizedIndex.load(index_dir, dtype=backend, space=space)
+    if backend == "ivf":
+        return IVFIndex.load(index_dir, space=space, n_lists=config.IVF_NLIST, nprobe=config.IVF_NPROBE)
+    raise ValueError(f"Unknown INDEX_BACKEND: {backend}")
+
+def records_collection_name(collection_name: str) -> str:
+    """Name of the vectorless collection that holds a local backend's chunks"""
+    return collection_name + RECORDS_SUFFIX
+
+def write_records(collection, ids: List[str], texts: List[str], metadatas: List[Optional[Dict[str, Any]]]):
+    """Upsert chunk text and metadata with placeholder embeddings"""
+    collection.upsert(
+        ids=list(ids), documents=list(texts), metadatas=[metadata or None for metadata in metadatas],
+        embeddings=[PLACEHOLDER_EMBEDDING] * len(ids)
+    )
+
+def fetch_embeddings(collection, ids: Optional[List[str]] = None, batch_size: int = 1000) -> Tuple[List[str], np.ndarray]:
+    """Read float32 vectors from Chroma, either for the given IDs or the whole collection"""
+    found_ids, vectors = [], []
+    if ids is not None:
+        for start in range(0, len(ids), batch_size):
+            page = collection.get(ids=ids[start:start + batch_size], include=["embeddings"])
+            found_ids.extend(page["ids"])
+            vectors.extend(page["embeddings"])
+    else:
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            found_ids.extend(page["ids"])
+            vectors.extend(page["embeddings"])
+            offset += len(page["ids"])
+    return found_ids, np.asarray(vectors, dtype=np.float32)
+
+def migrate_to_records(source, collection, index, batch_size: int = 1000) -> int:
+    """Move chunks stored with Chroma vectors into the records collection and the local index.
+
+    The source collection is left in place; once migrated it is no longer read.
+    """
+    migrated = 0
+    while True:
+        page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=migrated)
+        if not page["ids"]:
+            break
+        write_records(collection, page["ids"], page["documents"], page["metadatas"])
+        index.add(page["ids"], np.asarray(page["embeddings"], dtype=np.float32))
+        migrated += len(page["ids"])
+    index.save()
+    if migrated:
+        print(f"Migrated {migrated} chunks to {collection.name} and {type(index).__name__}")
+    return migrated
+
+def sync_local_index(index, collection, embeddings, batch_size: int = 500) -> bool:
+    """Bring the local index in step with the records collection.
+
+    Vectors of chunks that are no longer stored are dropped; chunks the index
+    lacks are embedded again from their text.
+    """
+    record_ids, offset = [], 0
+    while True:
+        page = collection.get(include=[], limit=10000, offset=offset)
+        if not page["ids"]:
+            break
+        record_ids.extend(page["ids"])
+        offset += len(page["ids"])
+    indexed = set(index.chunk_ids())
+    stored = set(record_ids)
+    stale = [chunk_id for chunk_id in indexed if chunk_id not in stored]
+    missing = [chunk_id for chunk_id in record_ids if chunk_id not in indexed]
+    if not stale and not missing:
+        return False
+    index.remove(stale)
+    for start in range(0, len(missing), batch_size):
+        rows = collection.get(ids=missing[start:start + batch_size], include=["documents"])
+        index.add(rows["ids"], np.asarray(embeddings.embed_documents(rows["documents"]), dtype=np.float32))
+    index.save()
+    print(f"Synced {type(index).__name__}: {len(missing)} vectors embedded, {len(stale)} removed")
+    return True
+
+def local_index_search(index, collection, query_vector: List[float], k: int, where: Optional[Dict[str, Any]] = None,
+                       rescore: bool = True, rescore_factor: int = 4, space: str = "l2") -> List[Tuple[Document, float]]:
+    """Search the local index and hydrate the hits from Chroma.
+
+    With rescore enabled and an approximate index, the index is asked for
+    k * rescore_factor candidates, which are re-ranked by exact float32 distance
+    (vectors read from the index's own store) before the top k are returned.
+    """
+    rescore = rescore and index.needs_rescore
+    allowed_ids = None
+    if where:
+        # Metadata predicates are resolved by Chroma, the vector scan is restricted to the matches
+        allowed_ids = collection.get(where=where, include=[])["ids"]
+        if not allowed_ids:
+            return []
+
+    candidates = index.search(query_vector, k * rescore_factor if rescore else k, allowed_ids=allowed_ids)
+    if not candidates:
+        return []
+
+    rows = collection.get(ids=[chunk_id for chunk_id, _ in candidates], include=["documents", "metadatas"])
+    position = {chunk_id: i for i, chunk_id in enumerate(rows["ids"])}
+
+    if rescore and rows["ids"]:
+        ids, vectors = index.vectors(rows["ids"])
+        exact = exact_distances(np.asarray(query_vector, dtype=np.float32), vectors, space) if ids else []
+        ranked = sorted(((chunk_id, float(distance)) for chunk_id, distance in zip(ids, exact)), key=lambda item: item[1])
+    else:
+        ranked = [(chunk_id, distance) for chunk_id, distance in candidates if chunk_id in position]
+
+    results = []
+    for chunk_id, distance in ranked[:k]:
+        i = position[chunk_id]
+        results.append((Document(id=chunk_id, page_content=rows["documents"][i], metadata=rows["metadatas"][i] or {}), distance))
+    return results
+
+def chroma_vector_search(collection, query_vector: List[float], k: int,
+                         where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+    """Query Chroma's own index, keeping chunk IDs on the returned documents"""
+    result = collection.query(
+        query_embeddings=[list(query_vector)], n_results=k, where=where,
+        include=["documents", "metadatas", "distances"]
+    )
+    return [
+        (Document(id=chunk_id, page_content=text, metadata=metadata or {}), distance)
+        for chunk_id, text, metadata, distance in zip(
+            result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+        )
+    ]
+
+def hydrate_chunks(collection, chunk_ids: List[str], query_vector: Optional[List[float]] = None,
+                   space: str = "l2", index=None) -> Dict[str, Tuple[Document, Optional[float]]]:
+    """Load chunks by ID, with their exact distance to query_vector when one is given.
+
+    Vectors come from the local index when one is given, otherwise from Chroma.
+    """
+    if not chunk_ids:
+        return {}
+    rows = collection.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+    distances = {}
+    if query_vector is not None and rows["ids"]:
+        ids, vectors = index.vectors(rows["ids"]) if index is not None else fetch_embeddings(collection, rows["ids"])
+        if ids:
+            exact = exact_distances(np.asarray(query_vector, dtype=np.float32), vectors, space)
+            distances = {chunk_id: float(distance) for chunk_id, distance in zip(ids, exact)}
+    return {
+        chunk_id: (
+            Document(id=chunk_id, page_content=rows["documents"][i], metadata=rows["metadatas"][i] or {}),
+            distances.get(chunk_id)
+        )
+        for i, chunk_id in enumerate(rows["ids"])
+    }
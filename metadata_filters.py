@@ -0,0 +1,77 @@
+import os
+import re
+from typing import List, Dict, Any, Optional, Union
+
+# Metadata keys the filtered search API can push down into the Chroma query
+FILE_NAME_KEY = "reference_file"
+SECTION_KEY = "primary_section"
+CATEGORY_KEY = "category"
+
+def _predicate(key: str, value: Union[str, List[str]]) -> Dict[str, Any]:
+    """Equality for a single value, membership for a list"""
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        if len(values) == 1:
+            return {key: {"$eq": values[0]}}
+        return {key: {"$in": values}}
+    return {key: {"$eq": value}}
+
+def build_metadata_filter(file_name: Optional[Union[str, List[str]]] = None,
+                          section: Optional[Union[str, List[str]]] = None,
+                          category: Optional[Union[str, List[str]]] = None) -> Optional[Dict[str, Any]]:
+    """Build a Chroma ``where`` clause from file, section and category predicates.
+
+    Returns None when no predicate is given so callers can pass the result
+    straight through as an unfiltered query.
+    """
+    predicates = []
+    if file_name:
+        predicates.append(_predicate(FILE_NAME_KEY, file_name))
+    if section:
+        predicates.append(_predicate(SECTION_KEY, section))
+    if category:
+        predicates.append(_predicate(CATEGORY_KEY, category))
+    
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+    return {"$and": predicates}
+
+def detect_category(file_name: str) -> str:
+    """Derive a policy category from the file name prefix (A.01.06 -> A, ALL - ... -> ALL)"""
+    code_match = re.match(r"^([A-Z])\.\d{2}", file_name)
+    if code_match:
+        return code_match.group(1)
+    if re.match(r"^ALL\b", file_name, re.IGNORECASE):
+        return "ALL"
+    return "General"
+
+def backfill_filter_metadata(collection, batch_size: int = 500) -> int:
+    """Add the section and category keys to chunks ingested before they were written; returns chunks updated.
+
+    Both are derived from metadata every chunk already carries (its section
+    headers and file name), so existing corpora need no re-ingest.
+    """
+    updated = 0
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            return updated
+        offset += len(page["ids"])
+        ids, metadatas = [], []
+        for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+            metadata = metadata or {}
+            if SECTION_KEY in metadata and CATEGORY_KEY in metadata:
+                continue
+            file_name = metadata.get("filename") or metadata.get(FILE_NAME_KEY) or os.path.basename(metadata.get("source", ""))
+            ids.append(chunk_id)
+            metadatas.append({
+                **metadata,
+                SECTION_KEY: metadata.get(SECTION_KEY, str(metadata.get("section_headers") or "").split(", ")[0]),
+                CATEGORY_KEY: metadata.get(CATEGORY_KEY) or detect_category(file_name)
+            })
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
@@ -28,7 +28,7 @@ def migrate_data():
     
     # Get all documents from local store
     try:
-        local_collection = local_store.chroma_client.get_collection(name="policy_documents")
+        local_collection = local_store.chroma_client.get_collection(name=local_store.collection_name)
         local_data = local_collection.get()
         
         print(f"📊 Found {len(local_data['documents'])} documents in local store")
@@ -0,0 +1,134 @@
+import os
+import json
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from metadata_filters import build_metadata_filter
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text finds every pattern it contains"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        self.patterns = [pattern.lower() for pattern in patterns]
+        for pattern_id, pattern in enumerate(self.patterns):
+            if pattern:
+                self._add(pattern, pattern_id)
+        self._link()
+
+    def _add(self, pattern: str, pattern_id: int):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(pattern_id)
+
+    def _link(self):
+        """Breadth-first pass setting failure links and merging outputs along them"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text: str) -> List[int]:
+        """IDs of the patterns occurring in text (case-insensitive), in order of first match"""
+        found, seen = [], set()
+        state = 0
+        for char in text.lower():
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern_id in self.output[state]:
+                if pattern_id not in seen:
+                    seen.add(pattern_id)
+                    found.append(pattern_id)
+        return found
+
+class PinnedChunkRules:
+    """Trigger terms mapped to chunks that are always added to matching queries.
+
+    Each rule has ``triggers`` plus either explicit ``chunk_ids`` or a ``phrase``
+    (optionally scoped by ``file_name``). Phrases are resolved to chunk IDs once
+    per corpus version, so a matching query only costs an ID lookup.
+    """
+
+    DEFAULT_SCORE = 0.8
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = [rule for rule in rules if rule.get("triggers") and (rule.get("chunk_ids") or rule.get("phrase"))]
+        self._trigger_rules: List[int] = []
+        triggers = []
+        for rule_id, rule in enumerate(self.rules):
+            for trigger in rule["triggers"]:
+                triggers.append(trigger)
+                self._trigger_rules.append(rule_id)
+        self.matcher = AhoCorasick(triggers)
+        self._lock = threading.Lock()
+        self._resolved: Dict[int, List[str]] = {}
+        self._resolved_version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @classmethod
+    def load(cls, rules_path: str) -> "PinnedChunkRules":
+        """Load rules from a JSON file ({"rules": [...]}); a missing or invalid file gives no rules"""
+        if not rules_path or not os.path.exists(rules_path):
+            return cls([])
+        try:
+            with open(rules_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data.get("rules", []))
+        except Exception as e:
+            print(f"Error loading pinned chunk rules {rules_path}: {str(e)}")
+            return cls([])
+
+    def match(self, query: str) -> List[int]:
+        """Indexes of the rules triggered by the query"""
+        rule_ids = []
+        for trigger_id in self.matcher.find(query):
+            rule_id = self._trigger_rules[trigger_id]
+            if rule_id not in rule_ids:
+                rule_ids.append(rule_id)
+        return rule_ids
+
+    def _rule_chunk_ids(self, rule_id: int, collection) -> List[str]:
+        rule = self.rules[rule_id]
+        if rule.get("chunk_ids"):
+            return list(rule["chunk_ids"])
+        where = build_metadata_filter(file_name=rule.get("file_name"))
+        return collection.get(where=where, where_document={"$contains": rule["phrase"]}, include=[])["ids"]
+
+    def pinned_chunk_ids(self, query: str, collection, corpus_version: int) -> List[Tuple[str, float]]:
+        """(chunk_id, score) pairs pinned for the query; phrase lookups are cached until the corpus changes"""
+        rule_ids = self.match(query)
+        if not rule_ids:
+            return []
+        with self._lock:
+            if self._resolved_version != corpus_version:
+                self._resolved = {}
+                self._resolved_version = corpus_version
+            pinned, seen = [], set()
+            for rule_id in rule_ids:
+                if rule_id not in self._resolved:
+                    self._resolved[rule_id] = self._rule_chunk_ids(rule_id, collection)
+                score = float(self.rules[rule_id].get("score", self.DEFAULT_SCORE))
+                for chunk_id in self._resolved[rule_id]:
+                    if chunk_id not in seen:
+                        seen.add(chunk_id)
+                        pinned.append((chunk_id, score))
+        return pinned
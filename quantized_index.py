@@ -0,0 +1,311 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import List, Optional, Tuple, Iterable
+
+import numpy as np
+
+# Rows scored per block, bounds the temporary float32 copy made while scanning
+SCAN_BLOCK_ROWS = 65536
+# IDs per SQLite lookup, stays under the parameter limit
+SQLITE_BATCH = 900
+# Share of the int8 codes that may have been clipped by adds since the last fit before the
+# range is refitted and every vector re-encoded from the float32 table
+REFIT_CLIP_RATE = 0.001
+
+def exact_distances(query: np.ndarray, vectors: np.ndarray, space: str) -> np.ndarray:
+    """Distances in Chroma's convention for the given space (lower is better)"""
+    dots = vectors @ query
+    if space == "cosine":
+        norms = np.linalg.norm(vectors, axis=1) * max(float(np.linalg.norm(query)), 1e-12)
+        return 1.0 - dots / np.maximum(norms, 1e-12)
+    if space == "ip":
+        return 1.0 - dots
+    return float(query @ query) - 2.0 * dots + np.einsum("ij,ij->i", vectors, vectors)
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of all files under path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def rows_to_vectors(rows: List[tuple]) -> Tuple[List[str], np.ndarray]:
+    """(chunk_id, float32 blob) rows as an ID list and a matrix"""
+    if not rows:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return [row[0] for row in rows], np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+
+def read_vectors(db, query: str, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+    """Run an ``IN ({})`` lookup in batches and stack the vectors found (in storage order)"""
+    found_ids, blocks = [], []
+    ids = list(ids)
+    for start in range(0, len(ids), SQLITE_BATCH):
+        batch = ids[start:start + SQLITE_BATCH]
+        batch_ids, batch_vectors = rows_to_vectors(db.execute(query.format(",".join("?" * len(batch))), batch).fetchall())
+        found_ids.extend(batch_ids)
+        if batch_ids:
+            blocks.append(batch_vectors)
+    return found_ids, np.vstack(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+
+class VectorTable:
+    """Float32 vectors by chunk ID in a SQLite file, read back only for the rows asked for"""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS vectors (chunk_id TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def put(self, ids: List[str], embeddings: np.ndarray):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO vectors (chunk_id, vector) VALUES (?, ?)",
+            [(chunk_id, vector.tobytes()) for chunk_id, vector in zip(ids, embeddings)]
+        )
+
+    def delete(self, ids: Iterable[str]):
+        self._db.executemany("DELETE FROM vectors WHERE chunk_id = ?", [(chunk_id,) for chunk_id in ids])
+
+    def clear(self):
+        self._db.execute("DELETE FROM vectors")
+
+    def get(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        return read_vectors(self._db, "SELECT chunk_id, vector FROM vectors WHERE chunk_id IN ({})", ids)
+
+    def items(self) -> Tuple[List[str], np.ndarray]:
+        rows = self._db.execute("SELECT chunk_id, vector FROM vectors").fetchall()
+        return rows_to_vectors(rows)
+
+    def commit(self):
+        self._db.commit()
+
+class QuantizedIndex:
+    """Flat vector index storing scalar-quantized embeddings.
+
+    ``int8`` mode keeps one byte per dimension plus a per-dimension scale and
+    offset (4x smaller than float32); ``float16`` halves the size. Queries scan
+    the quantized matrix block by block. The float32 vectors are kept on disk
+    in ``vectors.sqlite3`` and only read back for the candidates being
+    rescored.
+    """
+
+    needs_rescore = True  # scores are approximate
+
+    def __init__(self, index_dir: str, dtype: str = "int8", space: str = "l2"):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported quantized dtype: {dtype}")
+        self.index_dir = index_dir
+        self.dtype = dtype
+        self.space = space
+        self._lock = threading.RLock()
+        self.ids: List[str] = []
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.norms_sq: Optional[np.ndarray] = None
+        self.clipped = 0  # int8 values clipped to the fitted range since the last fit
+        os.makedirs(index_dir, exist_ok=True)
+        self._vectors = VectorTable(os.path.join(index_dir, "vectors.sqlite3"))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Quantization
+
+    def _fit(self, embeddings: np.ndarray):
+        """Per-dimension offset and scale mapping [min, max] onto 0..255"""
+        low = embeddings.min(axis=0)
+        high = embeddings.max(axis=0)
+        self.offsets = low.astype(np.float32)
+        self.scales = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        self.clipped = 0
+
+    def _encode(self, embeddings: np.ndarray) -> np.ndarray:
+        if self.dtype == "float16":
+            return embeddings.astype(np.float16)
+        codes = np.rint((embeddings - self.offsets) / self.scales)
+        self.clipped += int(np.count_nonzero((codes < 0) | (codes > 255)))
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def _refit(self):
+        """Fit the int8 range to every stored vector and re-encode them all from the float32 table"""
+        self.ids, embeddings = self._vectors.items()
+        self._fit(embeddings)
+        self.codes = self._encode(embeddings)
+        self.norms_sq = self._row_norms_sq(self.codes)
+
+    def _decode(self, codes: np.ndarray) -> np.ndarray:
+        if self.dtype == "float16":
+            return codes.astype(np.float32)
+        return codes.astype(np.float32) * self.scales + self.offsets
+
+    def _row_norms_sq(self, codes: np.ndarray) -> np.ndarray:
+        decoded = self._decode(codes)
+        return np.einsum("ij,ij->i", decoded, decoded).astype(np.float32)
+
+    # Maintenance
+
+    def build(self, ids: List[str], embeddings: np.ndarray):
+        """Replace the index contents"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self.ids = list(ids)
+            self._vectors.clear()
+            if not self.ids:
+                self.codes = None
+                self.norms_sq = None
+                return
+            if self.dtype == "int8":
+                self._fit(embeddings)
+            self.codes = self._encode(embeddings)
+            self.norms_sq = self._row_norms_sq(self.codes)
+            self._vectors.put(self.ids, embeddings)
+
+    def add(self, ids: List[str], embeddings: np.ndarray):
+        """Insert or overwrite vectors.
+
+        int8 values outside the fitted range are clipped; once more than
+        REFIT_CLIP_RATE of the codes have been clipped since the last fit (the
+        first batch was one file, later files drift outside it), the range is
+        refitted to all stored vectors and the index re-encoded.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.codes is None:
+                self.build(ids, embeddings)
+                return
+            self.remove(ids)
+            codes = self._encode(embeddings)
+            self._vectors.put(ids, embeddings)
+            if self.dtype == "int8" and self.clipped > REFIT_CLIP_RATE * (self.codes.size + codes.size):
+                self._refit()
+                return
+            self.ids.extend(ids)
+            self.codes = np.vstack([self.codes, codes])
+            self.norms_sq = np.concatenate([self.norms_sq, self._row_norms_sq(codes)])
+
+    def remove(self, ids: Iterable[str]):
+        drop = set(ids)
+        with self._lock:
+            if not drop or self.codes is None:
+                return
+            self._vectors.delete(drop)
+            keep = [i for i, chunk_id in enumerate(self.ids) if chunk_id not in drop]
+            if len(keep) == len(self.ids):
+                return
+            self.ids = [self.ids[i] for i in keep]
+            self.codes = self.codes[keep]
+            self.norms_sq = self.norms_sq[keep]
+
+    def clear(self):
+        self.build([], np.zeros((0, 0), dtype=np.float32))
+
+    # Search
+
+    def _approximate_distances(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        norms_sq = self.norms_sq if rows is None else self.norms_sq[rows]
+        if self.dtype == "int8":
+            # q . (c * s + o) = (q * s) . c + q . o, so the codes never need decoding
+            scaled_query = (query * self.scales).astype(np.float32)
+            bias = float(query @ self.offsets)
+        else:
+            scaled_query = query
+            bias = 0.0
+
+        dots = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+            dots[start:start + SCAN_BLOCK_ROWS] = block @ scaled_query + bias
+
+        if self.space == "cosine":
+            return 1.0 - dots / np.maximum(np.sqrt(norms_sq) * max(float(np.linalg.norm(query)), 1e-12), 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        return float(query @ query) - 2.0 * dots + norms_sq
+
+    def search(self, query: List[float], k: int, allowed_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Approximate top-k (id, distance) pairs, optionally restricted to allowed_ids"""
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self.codes is None or not self.ids:
+                return []
+            rows = None
+            if allowed_ids is not None:
+                allowed = set(allowed_ids)
+                rows = np.asarray([i for i, chunk_id in enumerate(self.ids) if chunk_id in allowed], dtype=np.int64)
+                if rows.size == 0:
+                    return []
+            distances = self._approximate_distances(query, rows)
+            k = min(k, distances.shape[0])
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.argsort(distances[top])]
+            positions = top if rows is None else rows[top]
+            return [(self.ids[int(p)], float(distances[int(t)])) for p, t in zip(positions, top)]
+
+    def chunk_ids(self) -> List[str]:
+        with self._lock:
+            return list(self.ids)
+
+    def vectors(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Exact float32 vectors of the given chunks that are indexed, read from disk"""
+        with self._lock:
+            return self._vectors.get(ids)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the quantized matrix and its side arrays"""
+        total = 0
+        for array in (self.codes, self.scales, self.offsets, self.norms_sq):
+            if array is not None:
+                total += array.nbytes
+        return total
+
+    def disk_bytes(self) -> int:
+        """Bytes on disk: the saved codes and the float32 vector table"""
+        return directory_size(self.index_dir)
+
+    # Persistence
+
+    def save(self):
+        with self._lock:
+            self._vectors.commit()
+            meta = {"dtype": self.dtype, "space": self.space, "ids": self.ids, "clipped": self.clipped}
+            if self.codes is not None:
+                np.save(os.path.join(self.index_dir, "codes.npy"), self.codes)
+                np.save(os.path.join(self.index_dir, "norms_sq.npy"), self.norms_sq)
+                if self.dtype == "int8":
+                    np.save(os.path.join(self.index_dir, "scales.npy"), self.scales)
+                    np.save(os.path.join(self.index_dir, "offsets.npy"), self.offsets)
+            tmp_path = os.path.join(self.index_dir, "index.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, os.path.join(self.index_dir, "index.json"))
+
+    @classmethod
+    def load(cls, index_dir: str, dtype: str = "int8", space: str = "l2") -> "QuantizedIndex":
+        """Load a saved index, re-encoding the stored float32 vectors when the saved codes are missing or unusable"""
+        index = cls(index_dir, dtype=dtype, space=space)
+        meta_path = os.path.join(index_dir, "index.json")
+        try:
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                # Codes do not depend on the distance space, only the scoring does
+                if meta.get("dtype") == dtype and meta.get("ids"):
+                    index.ids = meta["ids"]
+                    index.clipped = meta.get("clipped", 0)
+                    index.codes = np.load(os.path.join(index_dir, "codes.npy"))
+                    index.norms_sq = np.load(os.path.join(index_dir, "norms_sq.npy"))
+                    if dtype == "int8":
+                        index.scales = np.load(os.path.join(index_dir, "scales.npy"))
+                        index.offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+                    return index
+        except Exception as e:
+            print(f"Error loading quantized index from {index_dir}: {str(e)}")
+            index = cls(index_dir, dtype=dtype, space=space)
+        ids, embeddings = index._vectors.items()
+        if ids:
+            index.build(ids, embeddings)
+            index.save()
+        return index
@@ -0,0 +1,320 @@
+import time
+from typing import List, Dict, Any, Optional, Callable, Iterable
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from chunk_terms import keyword_overlap
+from adaptive_k import trim_to_adaptive_k
+from llm_cache import invoke_llm
+
+# Order the stages run in; a strategy lists the ones it uses
+STAGE_ORDER = ("retrieve", "fuse", "filter", "pin", "rerank", "expand", "pack", "generate")
+
+# Retrieval and ranking strategies; options not given fall back to the RAGSystem defaults.
+# "default" is RAGSystem; the others reproduce the former ImprovedRAGSystem ("improved"),
+# ImprovedSearchRAG ("rerank"), RobustRAG ("robust") and PrecisionRAG ("precision").
+STRATEGIES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "stages": ["retrieve", "pin", "expand", "pack", "generate"],
+        "adaptive_retrieval": True,
+        "prompt": "default"
+    },
+    "improved": {
+        "stages": ["retrieve", "fuse", "pack", "generate"],
+        "k": 15,
+        "expansion_k": 10,
+        "doc_type_k": 5,
+        "prompt": "improved"
+    },
+    "rerank": {
+        "stages": ["retrieve", "pin", "rerank", "pack", "generate"],
+        "k": 10,
+        "fetch_k": 20,
+        "boost": 0.2,
+        "prompt": "default"
+    },
+    "robust": {
+        "stages": ["retrieve", "filter", "rerank", "pack", "generate"],
+        "k": 10,
+        "fetch_factor": 2,
+        "min_score": 0.35,
+        "boost": 0.15,
+        "boost_cap": 1.0,
+        "prompt": "robust"
+    },
+    "precision": {
+        "stages": ["retrieve", "filter", "rerank", "pack", "generate"],
+        "k": 5,
+        "fetch_k": 20,
+        "min_score": 0.4,
+        "fallback_min_score": 0.3,
+        "min_results": 3,
+        "rerank_pool": 15,
+        "boost": 0.2,
+        "prompt": "precision"
+    }
+}
+
+# (system message, human message template with {context} and {question})
+PROMPTS: Dict[str, tuple] = {
+    "default": ("""You are a helpful assistant that answers questions based on policy documents.
+            Use the provided context to answer questions accurately and cite specific sources.
+
+            Guidelines:
+            1. Carefully read ALL the provided context - it contains relevant policy information
+            2. Look for specific policies, procedures, amounts, and approval requirements
+            3. Always cite the source document and section when possible
+            4. Be specific about amounts, approval processes, and requirements
+            5. If multiple sources are relevant, mention all of them
+            6. If you find relevant information in the context, use it to provide a comprehensive answer
+
+            Format your response with clear citations using the reference information provided.""", """Context from policy documents:
+            {context}
+
+            Question: {question}
+
+            IMPORTANT: Look carefully at the context above. If you find specific policies that directly relate to the question, use those policies to provide a detailed answer. Pay special attention to any budget amounts, approval requirements, and specific procedures mentioned in the context.
+
+            Please provide a comprehensive answer based on the context above, including proper citations to the source documents."""),
+    "improved": ("""You are a helpful assistant that answers questions based on policy documents.
+            Use the provided context to answer questions accurately and cite specific sources.
+
+            Guidelines:
+            1. Carefully read ALL the provided context - it contains relevant policy information
+            2. Look for specific policies, procedures, amounts, and approval requirements
+            3. Always cite the source document and section when possible
+            4. Be specific about amounts, approval processes, and requirements
+            5. If multiple sources are relevant, mention all of them
+            6. If you find relevant information in the context, use it to provide a comprehensive answer
+
+            Format your response with clear citations using the reference information provided.""", """Context from policy documents:
+            {context}
+
+            Question: {question}
+
+            Please provide a comprehensive answer based on the context above, including proper citations to the source documents."""),
+    "robust": ("""You are a helpful assistant that answers questions based on policy documents.
+            Your answers must be accurate and based ONLY on the provided context.
+
+            Critical Instructions:
+            1. Read ALL context carefully before answering
+            2. Find the MOST RELEVANT information for the specific question asked
+            3. Provide SPECIFIC details (amounts, approval processes, requirements)
+            4. If the context contains the answer, provide it with specific details
+            5. Cite the exact source document when possible
+            6. If you cannot find the answer in the context, clearly state that
+
+            Be precise and cite sources accurately.""", """Context from policy documents:
+            {context}
+
+            Question: {question}
+
+            Instructions: Answer this question using ONLY the information from the context above. If you find relevant information in the context, provide a detailed answer with specific details. If not, clearly state that the information is not available in the provided documents."""),
+    "precision": ("""You are a precise policy assistant. Answer ONLY based on the provided context.
+
+Rules:
+1. Use ONLY information from the context provided
+2. Be specific - quote exact amounts, approval processes, requirements
+3. If the exact answer is in the context, provide it
+4. If not enough information, say so clearly
+5. Never make assumptions beyond what's in the context
+
+Be concise and accurate.""", """Context:
+{context}
+
+Question: {question}
+
+Instructions: Answer the question using ONLY the specific information from the context above. If you find the exact answer, provide it with all details. If not, state clearly that the information is not available.""")
+}
+
+def build_messages(prompt: str, context: str, question: str) -> List[Any]:
+    system, human = PROMPTS[prompt]
+    return [SystemMessage(content=system), HumanMessage(content=human.format(context=context, question=question))]
+
+def expansion_queries(question: str) -> List[tuple]:
+    """(query, k key) pairs searched alongside the question by the "fuse" stage"""
+    lowered = question.lower()
+    queries = []
+    # Client meeting related keywords
+    if any(word in lowered for word in ["client", "meeting", "cafe", "restaurant"]):
+        queries.extend((query, "expansion_k") for query in [
+            "taking business clients out", "client budget", "business client expense", "client meeting",
+            "managers only client"
+        ])
+    # Reimbursement related keywords
+    if any(word in lowered for word in ["reimbursement", "reimburse", "expense"]):
+        queries.extend((query, "expansion_k") for query in [
+            "reimbursement policy", "expense approval", "budget allowance", "receipt required"
+        ])
+    # Document type queries
+    if any(word in lowered for word in ["reimbursement", "expense", "budget"]):
+        queries.extend((query, "doc_type_k") for query in [
+            "budgets reimbursements policy", "expense approval process", "budget allowance"
+        ])
+    if any(word in lowered for word in ["client", "meeting"]):
+        queries.extend((query, "doc_type_k") for query in ["client policy", "business client", "client referral"])
+    return queries
+
+class PipelineRun:
+    """State of one question going through the pipeline.
+
+    ``memo`` holds stage outputs keyed on their inputs; runs that share it
+    (see RAGPipeline.compare) reuse retrievals instead of repeating them.
+    """
+
+    def __init__(self, question: str, strategy: str, options: Dict[str, Any], memo: Optional[Dict] = None):
+        self.question = question
+        self.strategy = strategy
+        self.options = options
+        self.memo = {} if memo is None else memo
+        self.documents: List[Dict[str, Any]] = []
+        self.messages: Optional[List[Any]] = None
+        self.context_stats: Dict[str, Any] = {}
+        # What the prompt cites, in [Source n] order (see context_packer.pack_context)
+        self.sources: List[Dict[str, Any]] = []
+        self.answer: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+class RAGPipeline:
+    """Retrieve, fuse, filter, pin, rerank, expand, pack and generate as pluggable stages.
+
+    A strategy (STRATEGIES, or one passed in) names the stages to run and
+    their options; a stage is a callable taking the PipelineRun and can be
+    replaced or added with register_stage. Every stage is timed, and the
+    clients, caches and prompt packing of the owning RAGSystem are shared
+    by all strategies.
+    """
+
+    def __init__(self, rag_system, strategies: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.rag = rag_system
+        self.strategies = dict(STRATEGIES if strategies is None else strategies)
+        self.stages: Dict[str, Callable[[PipelineRun], None]] = {
+            name: getattr(self, f"_{name}") for name in STAGE_ORDER
+        }
+
+    def register_stage(self, name: str, stage: Callable[[PipelineRun], None]):
+        self.stages[name] = stage
+
+    def options(self, strategy: Optional[str] = None, k: Optional[int] = None,
+                mmr_lambda: Optional[float] = None) -> Dict[str, Any]:
+        strategy = strategy or self.rag.config.RAG_STRATEGY
+        if strategy not in self.strategies:
+            raise ValueError(f"Unknown RAG strategy: {strategy}")
+        options = dict(self.strategies[strategy])
+        if strategy == "default" or "k" not in options:
+            options["k"] = self.rag._context_k(k)
+        elif k:
+            options["k"] = k
+        options["mmr_lambda"] = mmr_lambda
+        return options
+
+    def prepare(self, question: str, strategy: Optional[str] = None, k: Optional[int] = None,
+                mmr_lambda: Optional[float] = None, memo: Optional[Dict] = None,
+                until: str = "generate") -> PipelineRun:
+        """Run the strategy's stages before ``until`` (the prompt is ready, the LLM not yet called)"""
+        options = self.options(strategy, k, mmr_lambda)
+        run = PipelineRun(question, strategy or self.rag.config.RAG_STRATEGY, options, memo)
+        for name in options["stages"]:
+            if name == until:
+                break
+            self.run_stage(name, run)
+        return run
+
+    def run(self, question: str, strategy: Optional[str] = None, k: Optional[int] = None,
+            mmr_lambda: Optional[float] = None, use_cache: bool = True, memo: Optional[Dict] = None) -> PipelineRun:
+        run = self.prepare(question, strategy, k, mmr_lambda, memo)
+        run.options["use_cache"] = use_cache
+        if run.documents and "generate" in run.options["stages"]:
+            self.run_stage("generate", run)
+        return run
+
+    def run_stage(self, name: str, run: PipelineRun):
+        started = time.perf_counter()
+        self.stages[name](run)
+        run.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def compare(self, question: str, strategies: Iterable[str], k: Optional[int] = None,
+                use_cache: bool = True) -> Dict[str, PipelineRun]:
+        """Run several strategies on one question, sharing retrievals between them (for A/B comparison)"""
+        memo: Dict = {}
+        return {strategy: self.run(question, strategy, k, use_cache=use_cache, memo=memo) for strategy in strategies}
+
+    @staticmethod
+    def _search_key(run: PipelineRun, query: str, k: int, adaptive_k: bool = False) -> tuple:
+        return ("search", query, k, run.options["mmr_lambda"], adaptive_k)
+
+    def _search(self, run: PipelineRun, query: str, k: int, adaptive_k: bool = False) -> List[Dict[str, Any]]:
+        """Retrieval through the run memo; callers get their own copies of the result dicts"""
+        key = self._search_key(run, query, k, adaptive_k)
+        if key not in run.memo:
+            run.memo[key] = self.rag.vector_store.get_relevant_documents_with_sources(
+                query, k=k, mmr_lambda=run.options["mmr_lambda"], adaptive_k=adaptive_k
+            )
+        return [dict(doc_info) for doc_info in run.memo[key]]
+
+    def _retrieve(self, run: PipelineRun):
+        options = run.options
+        fetch_k = options.get("fetch_k") or options["k"] * options.get("fetch_factor", 1)
+        adaptive = bool(options.get("adaptive_retrieval")) and self.rag.config.ADAPTIVE_K
+        run.documents = self._search(run, run.question, fetch_k, adaptive)
+
+    def _fuse(self, run: PipelineRun):
+        """Add results for related queries, drop repeated passages and keep the k best"""
+        results = list(run.documents)
+        expansions = expansion_queries(run.question)
+        # Embed every expansion query in one call under one deadline; the searches below reuse the vectors
+        pending = [query for query, k_key in expansions if self._search_key(run, query, run.options[k_key]) not in run.memo]
+        if pending:
+            self.rag.vector_store.embed_queries(pending)
+        for query, k_key in expansions:
+            results.extend(self._search(run, query, run.options[k_key]))
+        seen_content = set()
+        unique_results = []
+        for result in results:
+            if result["content"] not in seen_content:
+                seen_content.add(result["content"])
+                unique_results.append(result)
+        unique_results.sort(key=lambda x: x["similarity_score"], reverse=True)
+        run.documents = unique_results[:run.options["k"]]
+
+    def _filter(self, run: PipelineRun):
+        """Drop results under min_score, relaxing to fallback_min_score when fewer than min_results pass"""
+        options = run.options
+        kept = [doc for doc in run.documents if doc["similarity_score"] >= options["min_score"]]
+        if options.get("fallback_min_score") is not None and len(kept) < options.get("min_results", 0):
+            kept = [doc for doc in run.documents if doc["similarity_score"] >= options["fallback_min_score"]]
+        run.documents = kept
+
+    def _pin(self, run: PipelineRun):
+        key = ("pin", run.question)
+        if key not in run.memo:
+            run.memo[key] = self.rag.vector_store.get_pinned_documents(run.question)
+        self.rag._add_pinned_documents(run.question, run.documents, [dict(doc) for doc in run.memo[key]])
+
+    def _rerank(self, run: PipelineRun):
+        """Boost by the share of question terms each passage contains, then keep the k (or adaptive k) best"""
+        options = run.options
+        results = run.documents[:options["rerank_pool"]] if options.get("rerank_pool") else run.documents
+        for doc, overlap in zip(results, keyword_overlap(run.question, results)):
+            if overlap > 0:
+                doc["similarity_score"] += float(overlap) * options.get("boost", 0.2)
+                if options.get("boost_cap") is not None:
+                    doc["similarity_score"] = min(options["boost_cap"], doc["similarity_score"])
+        results.sort(key=lambda x: x["similarity_score"], reverse=True)
+        config = self.rag.config
+        if config.ADAPTIVE_K:
+            run.documents = trim_to_adaptive_k(results, config.ADAPTIVE_K_MIN, options["k"], config.ADAPTIVE_K_MIN_GAP)
+        else:
+            run.documents = results[:options["k"]]
+
+    def _expand(self, run: PipelineRun):
+        run.documents = self.rag.vector_store.expand_neighbors(run.documents)
+
+    def _pack(self, run: PipelineRun):
+        if run.documents:
+            run.messages, run.context_stats, run.sources = self.rag._build_messages(
+                run.question, run.documents, run.options.get("prompt", "default")
+            )
+
+    def _generate(self, run: PipelineRun):
+        run.answer = invoke_llm(self.rag.llm, run.messages, self.rag.llm_cache, run.options.get("use_cache", True))
@@ -1,15 +1,31 @@
 import json
-from typing import List, Dict, Any, Optional, Generator
-from langchain_openai import ChatOpenAI
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Generator, AsyncGenerator
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, SystemMessage
-from vector_store import VectorStoreManager
+from client_registry import get_vector_store, get_llm, get_llm_cache
 from config import Config
+from sentence_index import highlighted_preview, supporting_passage
+from llm_cache import invoke_llm, ainvoke_llm, stream_llm, astream_llm
+from single_flight import SingleFlight, normalize_question
+from context_packer import pack_context, merge_passages, count_tokens
+from context_compression import compress_passages
+from rag_pipeline import RAGPipeline, build_messages
+
+NO_RESULTS_RESPONSE = {
+    "answer": "I couldn't find relevant information in the policy documents to answer your question.",
+    "sources": [],
+    "confidence": 0.0
+}
 
 class RAGSystem:
-    def __init__(self):
+    def __init__(self, vector_store=None):
         self.config = Config()
-        self.vector_store = VectorStoreManager()
+        # The process-wide store unless one is given (e.g. a ProductionVectorStoreManager)
+        self.vector_store = vector_store or get_vector_store()
+        # Shared with the vector store, which invalidates answers whose chunks it deletes
+        self.answer_cache = self.vector_store.answer_cache
         
         # Initialize LLM
         # Ensure API key is set in environment
@@ -17,11 +33,11 @@ class RAGSystem:
             import os
             os.environ["OPENAI_API_KEY"] = self.config.OPENAI_API_KEY
         
-        self.llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.1,
-            streaming=True
-        )
+        self.llm = get_llm(temperature=0.1, streaming=True)
+        self.llm_cache = get_llm_cache()
+        self.single_flight = SingleFlight() if self.config.REQUEST_COALESCING else None
+        # Retrieval strategies as configurable stages (RAG_STRATEGY, or per request)
+        self.pipeline = RAGPipeline(self)
         
         # Create prompt template
         self.prompt_template = ChatPromptTemplate.from_messages([
@@ -47,133 +63,260 @@ Please provide a comprehensive answer based on the context above, including prop
     
     def format_context_with_sources(self, relevant_docs: List[Dict[str, Any]]) -> str:
         """Format context with source information for the prompt"""
-        formatted_context = ""
+        return self._pack_context(relevant_docs)[0]
+    
+    def _pack_context(self, relevant_docs: List[Dict[str, Any]], merged: bool = False):
+        """(context, tokens, sources) for the passages, packed into CONTEXT_TOKEN_BUDGET tokens.
         
-        for i, doc_info in enumerate(relevant_docs, 1):
-            content = doc_info["content"]
-            source_info = doc_info.get("source_info", {})
-            score = doc_info.get("similarity_score", 0)
-            
-            # Format source header
-            file_name = source_info.get("file_name", "Unknown Document")
-            section_headers = source_info.get("section_headers", [])
-            
-            source_header = f"[Source {i}: {file_name}"
-            if section_headers and len(section_headers) > 0:
-                source_header += f" - {', '.join(section_headers)}"
-            source_header += f"] (Relevance: {score:.3f})\n"
-            
-            formatted_context += source_header + content + "\n\n"
+        merged passages were already joined with their neighbors and are not joined again.
+        """
+        return pack_context(
+            relevant_docs, self.config.CONTEXT_TOKEN_BUDGET or float("inf"),
+            None if merged else self.vector_store.file_index, self.config.CHUNK_OVERLAP
+        )
+    
+    def _context_k(self, k: Optional[int]) -> int:
+        """Passages to retrieve; with ADAPTIVE_K this is the upper bound and the score gap decides"""
+        if k:
+            return k
+        return self.config.ADAPTIVE_K_MAX if self.config.ADAPTIVE_K else 5
+    
+    def _source_preview(self, doc_info: Dict[str, Any]) -> str:
+        """Preview around the best supporting sentence, or the opening 300 characters cut at a sentence end"""
+        content = doc_info["content"]
+        preview = highlighted_preview(content, doc_info.get("supporting_sentences") or [])
+        if preview:
+            return preview
+        preview = content[:300]
+        if len(content) > 300:
+            # Find the last complete sentence within 300 chars
+            last_period = preview.rfind('.')
+            if last_period > 200:  # Only if we have a reasonable amount of text
+                preview = preview[:last_period + 1]
+            else:
+                preview += "..."
+        return preview
+    
+    def _context_documents(self, question: str, relevant_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Passages as sent to the LLM.
         
-        return formatted_context
+        With CONTEXT_COMPRESSION each is cut to its best-matching sentences and
+        their headings; with SENTENCE_CONTEXT, to its supporting sentences and
+        their neighbors. Neighboring passages are joined before they are cut, as
+        the cut text no longer covers their chunk spans.
+        """
+        if not self.config.CONTEXT_COMPRESSION and not self.config.SENTENCE_CONTEXT:
+            return relevant_docs
+        relevant_docs = merge_passages(relevant_docs, self.vector_store.file_index, self.config.CHUNK_OVERLAP)
+        if self.config.CONTEXT_COMPRESSION:
+            return compress_passages(relevant_docs, question, self.config.COMPRESSION_MAX_SENTENCES)
+        return [
+            {**doc_info, "content": supporting_passage(
+                doc_info["content"], doc_info["supporting_sentences"], self.config.SENTENCE_CONTEXT_WINDOW
+            )} if doc_info.get("supporting_sentences") else doc_info
+            for doc_info in relevant_docs
+        ]
+    
+    def _cached_answer(self, question: str, k: Optional[int], mmr_lambda: Optional[float], use_cache: bool = True,
+                       strategy: Optional[str] = None):
+        """Look the question up in the semantic answer cache.
+        
+        Returns (cached response or None, key to store a fresh answer under or None).
+        With use_cache=False the lookup is skipped but the fresh answer is still stored.
+        """
+        if self.answer_cache is None:
+            return None, None
+        started = time.perf_counter()
+        query_vector = self.vector_store.embed_query(question)
+        return self._lookup_answer(question, query_vector, k, mmr_lambda, use_cache, strategy, started)
+    
+    async def _acached_answer(self, question: str, k: Optional[int], mmr_lambda: Optional[float], use_cache: bool = True,
+                              strategy: Optional[str] = None):
+        """_cached_answer with the async embedding client; the SQLite lookup runs in a worker thread"""
+        if self.answer_cache is None:
+            return None, None
+        started = time.perf_counter()
+        query_vector = await self.vector_store.aembed_query(question)
+        return await asyncio.to_thread(
+            self._lookup_answer, question, query_vector, k, mmr_lambda, use_cache, strategy, started
+        )
     
-    def generate_response(self, question: str, k: int = 5) -> Dict[str, Any]:
-        """Generate a response using RAG"""
+    def _lookup_answer(self, question: str, query_vector: Optional[List[float]], k: Optional[int],
+                       mmr_lambda: Optional[float], use_cache: bool, strategy: Optional[str] = None,
+                       started: Optional[float] = None):
+        if query_vector is None:
+            return None, None
+        params = json.dumps({"k": k, "mmr_lambda": mmr_lambda, "strategy": strategy or self.config.RAG_STRATEGY})
+        cached = self.answer_cache.lookup(query_vector, params) if use_cache else None
+        if cached is not None:
+            # Report this request's cost (embedding the question and the lookup), not the run that produced the answer
+            lookup_ms = round((time.perf_counter() - (started or time.perf_counter())) * 1000, 1)
+            cached = {**cached, "llm_latency_ms": None, "timings": {"answer_cache": lookup_ms}}
+        return cached, (question, query_vector, params)
+    
+    def _cache_answer(self, cache_key, response: Dict[str, Any], relevant_docs: List[Dict[str, Any]]):
+        """Store an answer along with every chunk it was grounded on"""
+        if cache_key is None:
+            return
+        question, query_vector, params = cache_key
+        chunk_ids = []
+        for doc_info in relevant_docs:
+            chunk_ids.extend(doc_info.get("expanded_chunk_ids") or [doc_info.get("chunk_id")])
         try:
-            # Retrieve relevant documents
-            relevant_docs = self.vector_store.get_relevant_documents_with_sources(question, k=k)
-            
-            # If query is about client meetings, also search for specific terms
-            if any(word in question.lower() for word in ["client", "meeting", "cafe", "restaurant"]):
-                # Get all chunks from Budgets & Reimbursements.pdf and find client meeting policy
-                all_results = self.vector_store.similarity_search("budgets reimbursements", k=50)
-                budget_chunks = [doc for doc in all_results if "Budgets & Reimbursements.pdf" in doc.metadata.get("reference_file", "")]
-                
-                # Find the client meeting chunk by text matching
-                for doc in budget_chunks:
-                    if "Taking business clients out" in doc.page_content:
-                        # Convert to the expected format
-                        client_doc = {
-                            "content": doc.page_content,
-                            "similarity_score": 0.8,  # High score since it's directly relevant
-                            "source_info": {
-                                "file_name": doc.metadata.get("reference_file", "Budgets & Reimbursements.pdf"),
-                                "file_path": doc.metadata.get("reference_path", ""),
-                                "section_headers": doc.metadata.get("section_headers", ""),
-                                "chunk_index": doc.metadata.get("chunk_index", 0)
-                            }
-                        }
-                        
-                        # Add to results if not already present
-                        seen_content = {doc["content"] for doc in relevant_docs}
-                        if client_doc["content"] not in seen_content:
-                            relevant_docs.append(client_doc)
-                            seen_content.add(client_doc["content"])
-                        break
-            
-            if not relevant_docs:
-                return {
-                    "answer": "I couldn't find relevant information in the policy documents to answer your question.",
-                    "sources": [],
-                    "confidence": 0.0
-                }
-            
-            # Format context for the prompt
-            context = self.format_context_with_sources(relevant_docs)
-            
-            # Create messages for the LLM
-            messages = [
-                SystemMessage(content="""You are a helpful assistant that answers questions based on policy documents. 
-            Use the provided context to answer questions accurately and cite specific sources.
-            
-            Guidelines:
-            1. Carefully read ALL the provided context - it contains relevant policy information
-            2. Look for specific policies, procedures, amounts, and approval requirements
-            3. Always cite the source document and section when possible
-            4. Be specific about amounts, approval processes, and requirements
-            5. If multiple sources are relevant, mention all of them
-            6. If you find relevant information in the context, use it to provide a comprehensive answer
-            
-            Format your response with clear citations using the reference information provided."""),
-                HumanMessage(content=f"""Context from policy documents:
-            {context}
-            
-            Question: {question}
-            
-            IMPORTANT: Look carefully at the context above. If you find specific policies that directly relate to the question, use those policies to provide a detailed answer. Pay special attention to any budget amounts, approval requirements, and specific procedures mentioned in the context.
-            
-            Please provide a comprehensive answer based on the context above, including proper citations to the source documents.""")
-            ]
-            
-            # Generate response
-            response = self.llm.invoke(messages)
-            answer = response.content
+            self.answer_cache.store(question, query_vector, response, chunk_ids, params)
+        except Exception as e:
+            print(f"Error caching answer: {str(e)}")
+    
+    def _add_pinned_documents(self, query: str, results: List[Dict[str, Any]],
+                              pinned: Optional[List[Dict[str, Any]]] = None):
+        """Append chunks pinned to the query by the trigger rules, skipping ones already retrieved"""
+        if pinned is None:
+            pinned = self.vector_store.get_pinned_documents(query)
+        seen_ids = {doc.get("chunk_id") for doc in results}
+        seen_content = {doc["content"] for doc in results}
+        for pinned_doc in pinned:
+            if pinned_doc["chunk_id"] not in seen_ids and pinned_doc["content"] not in seen_content:
+                results.append(pinned_doc)
+                seen_ids.add(pinned_doc["chunk_id"])
+                seen_content.add(pinned_doc["content"])
+    
+    def _prepare(self, question: str, strategy: Optional[str], k: Optional[int], mmr_lambda: Optional[float]):
+        """Pipeline run with the strategy's stages done up to the LLM call"""
+        run = self.pipeline.prepare(question, strategy, k, mmr_lambda)
+        if run.documents and run.messages is None:
+            self.pipeline.run_stage("pack", run)
+        return run
+    
+    async def _aprepare(self, question: str, strategy: Optional[str], k: Optional[int], mmr_lambda: Optional[float]):
+        """_prepare with the query embedded through the async client first (the stages reuse it from the memo)"""
+        await self.vector_store.aembed_query(question)
+        return await asyncio.to_thread(self._prepare, question, strategy, k, mmr_lambda)
+    
+    def _build_messages(self, question: str, relevant_docs: List[Dict[str, Any]], prompt: str = "default"):
+        """(prompt messages, context stats, cited sources) for the question over the retrieved passages"""
+        context_docs = self._context_documents(question, relevant_docs)
+        context, context_tokens, sources = self._pack_context(context_docs, merged=context_docs is not relevant_docs)
+        context_stats = {"context_tokens": context_tokens, "compression_ratio": None}
+        if context_docs is not relevant_docs:
+            retrieved_tokens = sum(count_tokens(doc_info["content"]) for doc_info in relevant_docs)
+            kept_tokens = sum(count_tokens(doc_info["content"]) for doc_info in context_docs)
+            context_stats["compression_ratio"] = round(kept_tokens / retrieved_tokens, 3) if retrieved_tokens else 1.0
+        return build_messages(prompt, context, question), context_stats, sources
+    
+    def _build_sources(self, packed_sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Source entries returned alongside the answer, one per [Source n] of the prompt and in the same order"""
+        sources = []
+        for packed in packed_sources:
+            passages = packed["passages"]
+            source_info = passages[0]["source_info"]  # passages are packed best score first
+            content = "\n...\n".join(passage["content"] for passage in passages)
+            highlights = list(dict.fromkeys(
+                sentence for passage in passages for sentence in passage.get("supporting_sentences") or []
+            ))
+            
+            sources.append({
+                "source_number": packed["source_number"],
+                "file_name": source_info["file_name"],
+                "file_path": source_info["file_path"],
+                "section_headers": list(dict.fromkeys(
+                    header for passage in passages for header in passage["source_info"]["section_headers"]
+                )),
+                "chunk_index": source_info["chunk_index"],
+                "relevance_score": passages[0]["similarity_score"],
+                "preview": self._source_preview({"content": content, "supporting_sentences": highlights}),
+                "highlights": highlights,
+                "full_content": content  # The text the LLM read for this source
+            })
+        return sources
+    
+    @staticmethod
+    def _confidence(packed_sources: List[Dict[str, Any]]) -> float:
+        """Average similarity score of the passages the LLM read"""
+        scores = [passage["similarity_score"] for packed in packed_sources for passage in packed["passages"]]
+        return sum(scores) / len(scores) if scores else 0.0
+    
+    def _build_result(self, answer: str, run, sources: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        relevant_docs = run.documents
+        return {
+            "answer": answer,
+            "sources": self._build_sources(run.sources) if sources is None else sources,
+            "confidence": self._confidence(run.sources),
+            "total_sources_found": len(run.sources),
+            "retrieval_mode": relevant_docs[0].get("retrieval_mode", "vector"),
+            **run.context_stats,
+            "llm_latency_ms": run.timings.get("generate"),
+            "strategy": run.strategy,
+            "timings": dict(run.timings)
+        }
+    
+    def generate_response(self, question: str, k: Optional[int] = None, mmr_lambda: Optional[float] = None,
+                          use_cache: bool = True, strategy: Optional[str] = None) -> Dict[str, Any]:
+        """Generate a response using RAG, served from the answer and prompt caches unless use_cache is False"""
+        try:
+            cached, cache_key = self._cached_answer(question, k, mmr_lambda, use_cache, strategy)
+            if cached is not None:
+                return {**cached, "cached": True}
             
-            # Extract sources for response
-            sources = []
-            for doc_info in relevant_docs:
-                source_info = doc_info["source_info"]
-                # Get the actual content for preview
-                content = doc_info["content"]
-                # Create a preview (first 300 characters, truncated intelligently)
-                preview = content[:300]
-                if len(content) > 300:
-                    # Find the last complete sentence within 300 chars
-                    last_period = preview.rfind('.')
-                    if last_period > 200:  # Only if we have a reasonable amount of text
-                        preview = preview[:last_period + 1]
-                    else:
-                        preview += "..."
-                
-                sources.append({
-                    "file_name": source_info["file_name"],
-                    "file_path": source_info["file_path"],
-                    "section_headers": source_info["section_headers"],
-                    "chunk_index": source_info["chunk_index"],
-                    "relevance_score": doc_info["similarity_score"],
-                    "preview": preview,
-                    "full_content": content  # Include full content for reference
-                })
+            run = self._prepare(question, strategy, k, mmr_lambda)
+            if not run.documents:
+                return dict(NO_RESULTS_RESPONSE)
             
-            # Calculate average confidence based on similarity scores
-            avg_confidence = sum(doc["similarity_score"] for doc in relevant_docs) / len(relevant_docs)
+            llm_started = time.perf_counter()
+            answer = invoke_llm(self.llm, run.messages, self.llm_cache, use_cache)
+            run.timings["generate"] = round((time.perf_counter() - llm_started) * 1000, 1)
+            result = self._build_result(answer, run)
+            self._cache_answer(cache_key, result, run.documents)
+            return result
             
+        except Exception as e:
             return {
-                "answer": answer,
-                "sources": sources,
-                "confidence": avg_confidence,
-                "total_sources_found": len(relevant_docs)
+                "answer": f"Error generating response: {str(e)}",
+                "sources": [],
+                "confidence": 0.0,
+                "error": str(e)
             }
+    
+    async def _flight_key(self, question: str, k: Optional[int], mmr_lambda: Optional[float], use_cache: bool,
+                          strategy: Optional[str]):
+        """Requests with equal keys are answered by one shared computation"""
+        corpus_version = await asyncio.to_thread(self.vector_store.file_index.refresh)
+        return (normalize_question(question), k, mmr_lambda, use_cache, strategy or self.config.RAG_STRATEGY,
+                corpus_version)
+    
+    async def agenerate_response(self, question: str, k: Optional[int] = None, mmr_lambda: Optional[float] = None,
+                                 use_cache: bool = True, strategy: Optional[str] = None) -> Dict[str, Any]:
+        """generate_response for the event loop.
+        
+        The question is embedded and answered through the async OpenAI
+        clients; Chroma, BM25 and the SQLite caches have no async API, so their
+        (short) calls run in worker threads instead of on the loop. With
+        REQUEST_COALESCING, concurrent identical requests share one answer.
+        """
+        if self.single_flight is None:
+            return await self._agenerate_response(question, k, mmr_lambda, use_cache, strategy)
+        key = await self._flight_key(question, k, mmr_lambda, use_cache, strategy)
+        response = await self.single_flight.run(
+            key, lambda: self._agenerate_response(question, k, mmr_lambda, use_cache, strategy)
+        )
+        return dict(response)
+    
+    async def _agenerate_response(self, question: str, k: Optional[int], mmr_lambda: Optional[float],
+                                  use_cache: bool, strategy: Optional[str]) -> Dict[str, Any]:
+        try:
+            cached, cache_key = await self._acached_answer(question, k, mmr_lambda, use_cache, strategy)
+            if cached is not None:
+                return {**cached, "cached": True}
+            
+            run = await self._aprepare(question, strategy, k, mmr_lambda)
+            if not run.documents:
+                return dict(NO_RESULTS_RESPONSE)
+            
+            llm_started = time.perf_counter()
+            answer = await ainvoke_llm(self.llm, run.messages, self.llm_cache, use_cache)
+            run.timings["generate"] = round((time.perf_counter() - llm_started) * 1000, 1)
+            result = self._build_result(answer, run)
+            await asyncio.to_thread(self._cache_answer, cache_key, result, run.documents)
+            return result
             
         except Exception as e:
             return {
@@ -183,99 +326,136 @@ Please provide a comprehensive answer based on the context above, including prop
                 "error": str(e)
             }
     
-    def generate_streaming_response(self, question: str, k: int = 5) -> Generator[Dict[str, Any], None, None]:
-        """Generate a streaming response using RAG"""
+    def generate_streaming_response(self, question: str, k: Optional[int] = None, mmr_lambda: Optional[float] = None,
+                                    use_cache: bool = True,
+                                    strategy: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
+        """Generate a streaming response using RAG (a cached answer is sent as a single chunk)"""
         try:
-            # Retrieve relevant documents
-            relevant_docs = self.vector_store.get_relevant_documents_with_sources(question, k=k)
-            
-            if not relevant_docs:
+            cached, cache_key = self._cached_answer(question, k, mmr_lambda, use_cache, strategy)
+            if cached is not None:
                 yield {
-                    "type": "complete",
-                    "answer": "I couldn't find relevant information in the policy documents to answer your question.",
-                    "sources": [],
-                    "confidence": 0.0
+                    "type": "sources",
+                    "sources": cached["sources"],
+                    "confidence": cached["confidence"],
+                    "retrieval_mode": cached.get("retrieval_mode"),
+                    "cached": True
                 }
+                yield {"type": "chunk", "content": cached["answer"]}
+                yield {"type": "complete", **cached, "cached": True}
                 return
             
-            # Format context for the prompt
-            context = self.format_context_with_sources(relevant_docs)
-            
-            # Create messages for the LLM
-            messages = [
-                SystemMessage(content="""You are a helpful assistant that answers questions based on policy documents. 
-            Use the provided context to answer questions accurately and cite specific sources.
-            
-            Guidelines:
-            1. Carefully read ALL the provided context - it contains relevant policy information
-            2. Look for specific policies, procedures, amounts, and approval requirements
-            3. Always cite the source document and section when possible
-            4. Be specific about amounts, approval processes, and requirements
-            5. If multiple sources are relevant, mention all of them
-            6. If you find relevant information in the context, use it to provide a comprehensive answer
-            
-            Format your response with clear citations using the reference information provided."""),
-                HumanMessage(content=f"""Context from policy documents:
-            {context}
-            
-            Question: {question}
-            
-            IMPORTANT: Look carefully at the context above. If you find specific policies that directly relate to the question, use those policies to provide a detailed answer. Pay special attention to any budget amounts, approval requirements, and specific procedures mentioned in the context.
-            
-            Please provide a comprehensive answer based on the context above, including proper citations to the source documents.""")
-            ]
+            run = self._prepare(question, strategy, k, mmr_lambda)
+            relevant_docs = run.documents
+            if not relevant_docs:
+                yield {"type": "complete", **NO_RESULTS_RESPONSE}
+                return
             
             # First yield the sources found
-            sources = []
-            for doc_info in relevant_docs:
-                source_info = doc_info["source_info"]
-                # Get the actual content for preview
-                content = doc_info["content"]
-                # Create a preview (first 300 characters, truncated intelligently)
-                preview = content[:300]
-                if len(content) > 300:
-                    # Find the last complete sentence within 300 chars
-                    last_period = preview.rfind('.')
-                    if last_period > 200:  # Only if we have a reasonable amount of text
-                        preview = preview[:last_period + 1]
-                    else:
-                        preview += "..."
-                
-                sources.append({
-                    "file_name": source_info["file_name"],
-                    "file_path": source_info["file_path"],
-                    "section_headers": source_info["section_headers"],
-                    "chunk_index": source_info["chunk_index"],
-                    "relevance_score": doc_info["similarity_score"],
-                    "preview": preview,
-                    "full_content": content  # Include full content for reference
-                })
-            
+            sources = self._build_sources(run.sources)
+            retrieval_mode = relevant_docs[0].get("retrieval_mode", "vector")
             yield {
                 "type": "sources",
                 "sources": sources,
-                "confidence": sum(doc["similarity_score"] for doc in relevant_docs) / len(relevant_docs)
+                "confidence": self._confidence(run.sources),
+                "retrieval_mode": retrieval_mode
             }
             
             # Stream the response
+            llm_started = time.perf_counter()
             answer_chunks = []
-            for chunk in self.llm.stream(messages):
-                if hasattr(chunk, 'content') and chunk.content:
-                    answer_chunks.append(chunk.content)
-                    yield {
-                        "type": "chunk",
-                        "content": chunk.content
-                    }
+            for content in stream_llm(self.llm, run.messages, self.llm_cache, use_cache):
+                answer_chunks.append(content)
+                yield {
+                    "type": "chunk",
+                    "content": content
+                }
+            run.timings["generate"] = round((time.perf_counter() - llm_started) * 1000, 1)
             
             # Yield final complete response
-            full_answer = "".join(answer_chunks)
+            result = self._build_result("".join(answer_chunks), run, sources)
+            self._cache_answer(cache_key, result, relevant_docs)
+            yield {"type": "complete", **result}
+            
+        except Exception as e:
             yield {
-                "type": "complete",
-                "answer": full_answer,
+                "type": "error",
+                "error": str(e),
+                "answer": f"Error generating response: {str(e)}",
+                "sources": []
+            }
+    
+    async def agenerate_streaming_response(self, question: str, k: Optional[int] = None,
+                                           mmr_lambda: Optional[float] = None, use_cache: bool = True,
+                                           strategy: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """generate_streaming_response for the event loop, built on llm.astream.
+        
+        The complete event reports time_to_first_token_ms, measured from the
+        start of the request to the first answer chunk. With REQUEST_COALESCING,
+        concurrent identical requests share one stream: a request joining late
+        first receives the events already produced, then follows live.
+        """
+        if self.single_flight is None:
+            stream = self._agenerate_streaming_response(question, k, mmr_lambda, use_cache, strategy)
+        else:
+            key = await self._flight_key(question, k, mmr_lambda, use_cache, strategy)
+            stream = self.single_flight.stream(
+                key, lambda: self._agenerate_streaming_response(question, k, mmr_lambda, use_cache, strategy)
+            )
+        async for event in stream:
+            yield event
+    
+    async def _agenerate_streaming_response(self, question: str, k: Optional[int], mmr_lambda: Optional[float],
+                                            use_cache: bool,
+                                            strategy: Optional[str]) -> AsyncGenerator[Dict[str, Any], None]:
+        started = time.perf_counter()
+        try:
+            cached, cache_key = await self._acached_answer(question, k, mmr_lambda, use_cache, strategy)
+            if cached is not None:
+                yield {
+                    "type": "sources",
+                    "sources": cached["sources"],
+                    "confidence": cached["confidence"],
+                    "retrieval_mode": cached.get("retrieval_mode"),
+                    "cached": True
+                }
+                yield {"type": "chunk", "content": cached["answer"]}
+                yield {
+                    "type": "complete", **cached, "cached": True,
+                    "time_to_first_token_ms": round((time.perf_counter() - started) * 1000, 1)
+                }
+                return
+            
+            run = await self._aprepare(question, strategy, k, mmr_lambda)
+            relevant_docs = run.documents
+            if not relevant_docs:
+                yield {"type": "complete", **NO_RESULTS_RESPONSE}
+                return
+            
+            sources = self._build_sources(run.sources)
+            yield {
+                "type": "sources",
                 "sources": sources,
-                "confidence": sum(doc["similarity_score"] for doc in relevant_docs) / len(relevant_docs)
+                "confidence": self._confidence(run.sources),
+                "retrieval_mode": relevant_docs[0].get("retrieval_mode", "vector")
             }
             
+            llm_started = time.perf_counter()
+            answer_chunks = []
+            time_to_first_token = None
+            async for content in astream_llm(self.llm, run.messages, self.llm_cache, use_cache):
+                if time_to_first_token is None:
+                    time_to_first_token = round((time.perf_counter() - started) * 1000, 1)
+                answer_chunks.append(content)
+                yield {
+                    "type": "chunk",
+                    "content": content
+                }
+            run.timings["generate"] = round((time.perf_counter() - llm_started) * 1000, 1)
+            
+            result = self._build_result("".join(answer_chunks), run, sources)
+            await asyncio.to_thread(self._cache_answer, cache_key, result, relevant_docs)
+            yield {"type": "complete", **result, "time_to_first_token_ms": time_to_first_token}
+            
         except Exception as e:
             yield {
                 "type": "error",
@@ -284,6 +464,14 @@ Please provide a comprehensive answer based on the context above, including prop
                 "sources": []
             }
     
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the semantic answer cache and the prompt-level LLM cache, and coalesced requests"""
+        return {
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "llm_cache": self.llm_cache.stats() if self.llm_cache is not None else None,
+            "coalesced_requests": self.single_flight.coalesced if self.single_flight is not None else None
+        }
+    
     def get_document_summary(self, file_path: str) -> Dict[str, Any]:
         """Get a summary of a specific document"""
         try:
@@ -291,7 +479,11 @@ Please provide a comprehensive answer based on the context above, including prop
             collection = self.vector_store.chroma_client.get_collection(
                 name=self.vector_store.collection_name
             )
-            results = collection.get(where={"source": file_path})
+            chunk_ids = self.vector_store.file_index.get_chunk_ids(file_path)
+            if chunk_ids:
+                results = collection.get(ids=chunk_ids)
+            else:
+                results = collection.get(where={"source": file_path})
             
             if not results["documents"]:
                 return {"error": "Document not found in vectorstore"}
@@ -325,33 +517,7 @@ Please provide a comprehensive answer based on the context above, including prop
         # First, try the original semantic search
         results = self.vector_store.get_relevant_documents_with_sources(query, k=k)
         
-        # If query is about client meetings, also search for specific terms
-        if any(word in query.lower() for word in ["client", "meeting", "cafe", "restaurant"]):
-            # Get all chunks from Budgets & Reimbursements.pdf and find client meeting policy
-            all_results = self.vector_store.similarity_search("budgets reimbursements", k=50)
-            budget_chunks = [doc for doc in all_results if "Budgets & Reimbursements.pdf" in doc.metadata.get("reference_file", "")]
-            
-            # Find the client meeting chunk by text matching
-            for doc in budget_chunks:
-                if "Taking business clients out" in doc.page_content:
-                    # Convert to the expected format
-                    client_doc = {
-                        "content": doc.page_content,
-                        "similarity_score": 0.8,  # High score since it's directly relevant
-                        "source_info": {
-                            "file_name": doc.metadata.get("reference_file", "Budgets & Reimbursements.pdf"),
-                            "file_path": doc.metadata.get("reference_path", ""),
-                            "section_headers": doc.metadata.get("section_headers", ""),
-                            "chunk_index": doc.metadata.get("chunk_index", 0)
-                        }
-                    }
-                    
-                    # Add to results if not already present
-                    seen_content = {doc["content"] for doc in results}
-                    if client_doc["content"] not in seen_content:
-                        results.append(client_doc)
-                        seen_content.add(client_doc["content"])
-                    break
+        self._add_pinned_documents(query, results)
         
         # Sort by relevance score and return top k
         results.sort(key=lambda x: x["similarity_score"], reverse=True)
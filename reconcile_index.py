@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Reconcile the file -> chunk ID index with the vector store
+Reports chunks no indexed file accounts for (e.g. left behind when a file was
+ingested under a different path on another host) and optionally repairs them.
+"""
+
+import argparse
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and clean up orphaned chunks")
+    parser.add_argument("--adopt", action="store_true",
+                        help="Register chunks of files the index has never seen (migrates pre-index collections)")
+    parser.add_argument("--delete", action="store_true",
+                        help="Delete orphaned chunks and drop dangling index entries")
+    parser.add_argument("--summaries", action="store_true",
+                        help="Rebuild the per-document summary vectors used by two-stage retrieval")
+    parser.add_argument("--sentences", action="store_true",
+                        help="Index the sentences of chunks ingested before the sentence index existed")
+    parser.add_argument("--production", action="store_true",
+                        help="Use the production ChromaDB server instead of the local store")
+    args = parser.parse_args()
+    
+    if args.production:
+        from vector_store_prod import ProductionVectorStoreManager
+        vector_store = ProductionVectorStoreManager()
+    else:
+        from vector_store import VectorStoreManager
+        vector_store = VectorStoreManager()
+    
+    report = vector_store.reconcile_file_index(delete_orphans=args.delete, adopt_unindexed=args.adopt)
+    if "error" in report:
+        print(f"❌ Reconciliation failed: {report['error']}")
+        return
+    
+    print(f"Indexed files: {len(vector_store.file_index.files)}")
+    if "adopted_chunks" in report:
+        print(f"Adopted chunks: {report['adopted_chunks']}")
+    print(f"Orphaned chunks: {report['orphaned_count']}")
+    for file_key, chunk_ids in sorted(report["orphaned_chunks"].items()):
+        print(f"  - {file_key or '<no file metadata>'}: {len(chunk_ids)} chunks")
+    if report["unindexed_files"]:
+        print(f"Files never indexed: {', '.join(report['unindexed_files'])}")
+    print(f"Dangling index entries: {len(report['dangling_ids'])}")
+    
+    if args.summaries:
+        print(f"✅ Rebuilt {vector_store.rebuild_document_summaries()} document summaries")
+    
+    if args.sentences:
+        print(f"✅ Indexed {vector_store.rebuild_sentence_index()} sentences")
+    
+    if args.delete:
+        print(f"✅ Deleted {report.get('deleted_chunks', 0)} orphaned chunks")
+    elif report["orphaned_count"]:
+        print("Run again with --adopt and/or --delete to repair")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+def distance_to_similarity(distance: float, space: str = "l2") -> float:
+    """Map a Chroma-convention distance onto a 0..1 similarity (higher is better).
+
+    ``l2`` distances are squared Euclidean; for the unit-length OpenAI
+    embeddings d = 2 - 2 * cos, so cos = 1 - d / 2. ``cosine`` and ``ip``
+    distances are 1 - similarity. Negative similarities are clipped to 0.
+    """
+    if space == "l2":
+        similarity = 1.0 - distance / 2.0
+    else:
+        similarity = 1.0 - distance
+    return min(1.0, max(0.0, similarity))
+
+def normalize_score(score: float, mode: str, space: str = "l2") -> float:
+    """Similarity for a retrieval score: lexical scores are already scaled to the best BM25 match"""
+    if mode == "lexical":
+        return min(1.0, max(0.0, score))
+    return distance_to_similarity(score, space)
@@ -0,0 +1,188 @@
+import re
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+from langchain_core.documents import Document
+
+from chunk_terms import keyword_overlap
+from quantized_index import exact_distances
+from local_index import records_collection_name, write_records, migrate_to_records, sync_local_index
+
+SENTENCE_COLLECTION_NAME = "policy_sentences"
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])|\n+")
+MIN_SENTENCE_WORDS = 3
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences and list items of a chunk; fragments under MIN_SENTENCE_WORDS words join the previous one"""
+    sentences: List[str] = []
+    for piece in SENTENCE_BOUNDARY.split(text):
+        piece = re.sub(r"\s+", " ", piece).strip()
+        if not piece or re.fullmatch(r"--- Page \d+ ---", piece):
+            continue
+        if sentences and len(piece.split()) < MIN_SENTENCE_WORDS:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+def supporting_passage(content: str, supporting: Iterable[str], window: int = 1) -> str:
+    """The supporting sentences of a passage plus ``window`` neighbors each side, gaps marked with "..." """
+    sentences = split_sentences(content)
+    wanted = set(supporting)
+    keep = set()
+    for i, sentence in enumerate(sentences):
+        if sentence in wanted:
+            keep.update(range(max(0, i - window), min(len(sentences), i + window + 1)))
+    if not keep:
+        return content
+    parts, previous = [], -1
+    for i in sorted(keep):
+        if previous >= 0 and i != previous + 1:
+            parts.append("...")
+        parts.append(sentences[i])
+        previous = i
+    return " ".join(parts)
+
+def highlighted_preview(content: str, supporting: List[str], max_chars: int = 300) -> str:
+    """Preview centred on the best supporting sentence, with that sentence in **bold**"""
+    if not supporting:
+        return ""
+    sentences = split_sentences(content)
+    if supporting[0] not in sentences:
+        return f"**{supporting[0]}**"
+    i = sentences.index(supporting[0])
+    preview = f"**{sentences[i]}**"
+    before, after = i - 1, i + 1
+    while True:
+        grew = False
+        if before >= 0 and len(preview) + len(sentences[before]) + 1 <= max_chars:
+            preview = f"{sentences[before]} {preview}"
+            before -= 1
+            grew = True
+        if after < len(sentences) and len(preview) + len(sentences[after]) + 1 <= max_chars:
+            preview = f"{preview} {sentences[after]}"
+            after += 1
+            grew = True
+        if not grew:
+            break
+    return ("..." if before >= 0 else "") + preview + ("..." if after < len(sentences) else "")
+
+class SentenceIndex:
+    """Sentence-level vectors linked to their parent chunks.
+
+    Each sentence is stored with its parent ``chunk_id`` and position, so a
+    query can be matched to the exact sentences of the chunks it retrieved.
+    With a local index (the configured INDEX_BACKEND), Chroma only keeps the
+    sentence records and the vectors stay in that index, as for chunks;
+    sentences stored with Chroma vectors are migrated on first use.
+    """
+
+    def __init__(self, chroma_client, embeddings, collection_metadata: Optional[Dict[str, Any]] = None,
+                 local_index=None):
+        self.embeddings = embeddings
+        self.local_index = local_index
+        if local_index is None:
+            self.collection = chroma_client.get_or_create_collection(
+                name=SENTENCE_COLLECTION_NAME, metadata=collection_metadata
+            )
+            return
+        self.collection = chroma_client.get_or_create_collection(
+            name=records_collection_name(SENTENCE_COLLECTION_NAME), metadata=collection_metadata
+        )
+        if self.collection.count() == 0:
+            try:
+                source = chroma_client.get_collection(name=SENTENCE_COLLECTION_NAME)
+                if source.count():
+                    migrate_to_records(source, self.collection, local_index)
+            except Exception:
+                # No sentences stored with Chroma vectors
+                pass
+        sync_local_index(local_index, self.collection, embeddings)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add_chunks(self, chunk_ids: List[str], documents: List[Document]) -> int:
+        """Embed the sentences of chunks not indexed yet (unchanged chunks keep their IDs and are skipped)"""
+        if not chunk_ids:
+            return 0
+        indexed = {
+            metadata["chunk_id"]
+            for metadata in self.collection.get(where={"chunk_id": {"$in": list(chunk_ids)}}, include=["metadatas"])["metadatas"]
+        }
+        ids, texts, metadatas = [], [], []
+        for chunk_id, doc in zip(chunk_ids, documents):
+            if chunk_id in indexed:
+                continue
+            for position, sentence in enumerate(split_sentences(doc.page_content)):
+                ids.append(f"{chunk_id}:{position}")
+                texts.append(sentence)
+                metadatas.append({
+                    "chunk_id": chunk_id,
+                    "sentence_index": position,
+                    "reference_file": doc.metadata.get("reference_file", "")
+                })
+        if not ids:
+            return 0
+        vectors = self.embeddings.embed_documents(texts)
+        if self.local_index is None:
+            self.collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=vectors)
+        else:
+            write_records(self.collection, ids, texts, metadatas)
+            self.local_index.add(ids, np.asarray(vectors, dtype=np.float32))
+            self.local_index.save()
+        return len(ids)
+
+    def remove_chunks(self, chunk_ids: List[str]):
+        if not chunk_ids:
+            return
+        where = {"chunk_id": {"$in": list(chunk_ids)}}
+        if self.local_index is not None:
+            self.local_index.remove(self.collection.get(where=where, include=[])["ids"])
+            self.local_index.save()
+        self.collection.delete(where=where)
+
+    def clear(self):
+        ids = self.collection.get(include=[])["ids"]
+        if ids:
+            self.collection.delete(ids=ids)
+        if self.local_index is not None:
+            self.local_index.clear()
+            self.local_index.save()
+
+    def best_sentences(self, chunk_ids: List[str], per_chunk: int = 2, query_vector: Optional[List[float]] = None,
+                       query: Optional[str] = None) -> Dict[str, List[str]]:
+        """The sentences of each chunk that best match the query, best first.
+
+        Ranked by vector distance when a query vector is available, otherwise by
+        keyword overlap with the query text (lexical-only retrieval).
+        """
+        if not chunk_ids:
+            return {}
+        where = {"chunk_id": {"$in": list(chunk_ids)}}
+        if query_vector is not None and self.local_index is not None:
+            # Only the sentences of the retrieved chunks are candidates, so they are scored exactly
+            page = self.collection.get(where=where, include=["documents", "metadatas"])
+            rows = dict(zip(page["ids"], zip(page["documents"], page["metadatas"])))
+            ids, vectors = self.local_index.vectors(list(rows))
+            order = np.argsort(exact_distances(np.asarray(query_vector, dtype=np.float32), vectors, self.local_index.space)) if ids else []
+            rows = [rows[ids[int(i)]] for i in order]
+        elif query_vector is not None:
+            result = self.collection.query(
+                query_embeddings=[list(query_vector)], n_results=max(per_chunk * len(chunk_ids) * 4, 1),
+                where=where, include=["documents", "metadatas"]
+            )
+            rows = list(zip(result["documents"][0], result["metadatas"][0]))
+        else:
+            page = self.collection.get(where=where, include=["documents", "metadatas"])
+            rows = list(zip(page["documents"], page["metadatas"]))
+            if query and rows:
+                overlap = keyword_overlap(query, [{"content": text, "metadata": {}} for text, _ in rows])
+                rows = [rows[i] for i in np.argsort(-overlap, kind="stable") if overlap[i] > 0]
+
+        best: Dict[str, List[str]] = {}
+        for text, metadata in rows:
+            sentences = best.setdefault(metadata["chunk_id"], [])
+            if len(sentences) < per_chunk:
+                sentences.append(text)
+        return best
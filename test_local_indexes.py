@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the local vector index backends (no OpenAI or Chroma needed)
+"""
+
+import numpy as np
+import pytest
+
+from quantized_index import QuantizedIndex, exact_distances
+from ivf_index import IVFIndex, kmeans, assign_to_centroids
+
+def _corpus(n=2000, dim=64, queries=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32), rng.standard_normal((queries, dim)).astype(np.float32)
+
+def _recall_at_10(index, vectors, queries, space="l2"):
+    """Share of the exact top 10 found in the index's top 10, averaged over the queries"""
+    hits = 0
+    for query in queries:
+        exact = {str(i) for i in np.argsort(exact_distances(query, vectors, space))[:10]}
+        hits += len(exact & {chunk_id for chunk_id, _ in index.search(query, 10)})
+    return hits / (10 * len(queries))
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_recall(tmp_path, dtype):
+    vectors, queries = _corpus()
+    index = QuantizedIndex(str(tmp_path), dtype=dtype)
+    index.build([str(i) for i in range(len(vectors))], vectors)
+    assert _recall_at_10(index, vectors, queries) >= 0.9
+
+def test_int8_incremental_adds_keep_recall(tmp_path):
+    # The first batch is one narrow "file"; later batches fall outside its range and must trigger a refit
+    vectors, queries = _corpus()
+    vectors[:20] *= 0.1
+    index = QuantizedIndex(str(tmp_path), dtype="int8")
+    for start in range(0, len(vectors), 20):
+        index.add([str(i) for i in range(start, start + 20)], vectors[start:start + 20])
+    assert len(index) == len(vectors)
+    assert _recall_at_10(index, vectors, queries) >= 0.9
+
+def test_int8_round_trip_error(tmp_path):
+    vectors, _ = _corpus(n=200)
+    index = QuantizedIndex(str(tmp_path), dtype="int8")
+    index.build([str(i) for i in range(len(vectors))], vectors)
+    step = (vectors.max(axis=0) - vectors.min(axis=0)) / 255.0
+    assert np.all(np.abs(index._decode(index.codes) - vectors) <= step / 2 + 1e-5)
+
+def test_quantized_save_load_and_remove(tmp_path):
+    vectors, queries = _corpus(n=300)
+    index = QuantizedIndex(str(tmp_path), dtype="int8", space="cosine")
+    index.build([str(i) for i in range(len(vectors))], vectors)
+    index.remove(["0", "1"])
+    index.save()
+    loaded = QuantizedIndex.load(str(tmp_path), dtype="int8", space="cosine")
+    assert len(loaded) == len(vectors) - 2
+    assert loaded.vectors(["0", "5"])[0] == ["5"]
+    assert {chunk_id for chunk_id, _ in loaded.search(queries[0], 20)}.isdisjoint({"0", "1"})
+
+def test_assign_to_centroids_picks_nearest():
+    centroids = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]], dtype=np.float32)
+    vectors = np.array([[1.0, 1.0], [9.0, -1.0], [-1.0, 8.0], [6.0, 0.0]], dtype=np.float32)
+    assert assign_to_centroids(vectors, centroids, block_rows=3).tolist() == [0, 1, 2, 1]
+
+def test_kmeans_separates_clusters():
+    rng = np.random.default_rng(1)
+    centers = np.array([[0.0, 0.0], [20.0, 20.0], [-20.0, 20.0]], dtype=np.float32)
+    vectors = np.vstack([center + rng.standard_normal((50, 2)) for center in centers]).astype(np.float32)
+    assignments = assign_to_centroids(vectors, kmeans(vectors, 3))
+    # Every true cluster maps to a single centroid, and to a different one
+    labels = [set(assignments[i * 50:(i + 1) * 50].tolist()) for i in range(3)]
+    assert all(len(label) == 1 for label in labels)
+    assert len(set.union(*labels)) == 3
+
+def test_ivf_assigns_postings_and_searches(tmp_path):
+    vectors, queries = _corpus()
+    index = IVFIndex(str(tmp_path), n_lists=16, nprobe=16)
+    index.build([str(i) for i in range(len(vectors))], vectors)
+    lists = dict(index._db.execute("SELECT chunk_id, list_id FROM postings").fetchall())
+    expected = assign_to_centroids(vectors, index.centroids)
+    assert all(lists[str(i)] == expected[i] for i in range(len(vectors)))
+    # Probing every list is an exact search
+    assert _recall_at_10(index, vectors, queries) == 1.0
+
+def test_ivf_allowed_ids_scan_exactly(tmp_path):
+    vectors, queries = _corpus(n=500)
+    index = IVFIndex(str(tmp_path), n_lists=16, nprobe=1)
+    index.build([str(i) for i in range(len(vectors))], vectors)
+    allowed = [str(i) for i in range(0, 500, 7)]
+    found = [chunk_id for chunk_id, _ in index.search(queries[0], 5, allowed_ids=allowed)]
+    distances = exact_distances(queries[0], vectors[::7], "l2")
+    assert found == [allowed[i] for i in np.argsort(distances)[:5]]
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the retrieval and context helpers (no OpenAI or Chroma needed)
+"""
+
+import numpy as np
+
+from adaptive_k import choose_k
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from chunk_index import FileChunkIndex
+from context_expansion import merge_overlapping_text
+from context_packer import pack_context, count_tokens
+from diversity import mmr_select
+from pinned_chunks import AhoCorasick, PinnedChunkRules
+
+# BM25 and reciprocal rank fusion
+
+def _bm25(tmp_path, chunks):
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    index.add(chunks.items())
+    index.save()
+    return index
+
+def test_tokenize_keeps_codes_and_contractions():
+    assert tokenize("Policy A.01.06 doesn't apply") == ["policy", "a.01.06", "doesn't", "apply"]
+
+def test_bm25_ranks_rare_term_and_shorter_chunk_first(tmp_path):
+    index = _bm25(tmp_path, {
+        "a": "gifts from clients must be declared",
+        "b": "gifts from clients must be declared to the compliance team within five working days of receipt",
+        "c": "annual leave must be booked in advance",
+        "d": "expenses must be approved by a manager",
+    })
+    results = index.search("declared gifts", 4)
+    assert [chunk_id for chunk_id, _ in results] == ["a", "b"]
+    assert results[0][1] > results[1][1] > 0
+
+def test_bm25_score_matches_formula(tmp_path):
+    index = _bm25(tmp_path, {"a": "travel travel policy", "b": "leave policy", "c": "gift register"})
+    (chunk_id, score), = index.search("travel", 1)
+    avg_length = 7 / 3
+    idf = np.log(1 + (3 - 1 + 0.5) / (1 + 0.5))
+    tf_part = 2 * 2.5 / (2 + 1.5 * (1 - 0.75 + 0.75 * 3 / avg_length))
+    assert chunk_id == "a"
+    assert np.isclose(score, idf * tf_part)
+
+def test_bm25_remove_allowed_ids_and_reload(tmp_path):
+    index = _bm25(tmp_path, {"a": "client gifts", "b": "client gifts register", "c": "leave"})
+    assert [chunk_id for chunk_id, _ in index.search("gifts", 5, allowed_ids=["b"])] == ["b"]
+    index.remove(["a"])
+    index.save()
+    reloaded = BM25Index(index.index_path)
+    assert len(reloaded) == 2
+    assert [chunk_id for chunk_id, _ in reloaded.search("gifts", 5)] == ["b"]
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [chunk_id for chunk_id, _ in fused] == ["b", "a", "d", "c"]
+    assert np.isclose(dict(fused)["b"], 1 / 62 + 1 / 61)
+
+# Aho-Corasick trigger matching
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasick(["he", "she", "his", "hers", ""])
+    assert matcher.find("USHERS") == [1, 0, 3]
+    assert matcher.find("this") == [2]
+    assert matcher.find("nothing here") == [0]
+    assert matcher.find("xyz") == []
+
+def test_pinned_rules_match_once_per_rule():
+    rules = PinnedChunkRules([
+        {"triggers": ["client referral", "referral fee"], "chunk_ids": ["r1"]},
+        {"triggers": ["christmas"], "chunk_ids": ["x1"]},
+        {"triggers": ["ignored"]},
+    ])
+    assert len(rules) == 2
+    assert rules.match("What is the referral fee for a client referral?") == [0]
+    assert rules.match("Christmas party referral fee") == [1, 0]
+    assert rules.pinned_chunk_ids("christmas", collection=None, corpus_version=1) == [("x1", PinnedChunkRules.DEFAULT_SCORE)]
+
+# MMR and adaptive k
+
+def test_mmr_skips_near_duplicates():
+    vectors = np.array([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.7, 0.7, 0.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+    query = np.array([1.0, 0.2, 0.0], dtype=np.float32)
+    # Candidate 0 is the second most relevant but nearly repeats candidate 1
+    assert mmr_select(vectors, 2, lambda_mult=0.5, query_vector=query) == [1, 2]
+    # With lambda 1 it is plain relevance ranking
+    assert mmr_select(vectors, 3, lambda_mult=1.0, query_vector=query) == [1, 0, 2]
+
+def test_mmr_with_relevance_scores():
+    vectors = np.eye(3, dtype=np.float32)
+    assert mmr_select(vectors, 5, relevance=np.array([0.2, 0.9, 0.5])) == [1, 2, 0]
+    assert mmr_select(vectors, 0, relevance=np.array([0.2, 0.9, 0.5])) == []
+
+def test_choose_k_cuts_at_largest_gap():
+    assert choose_k([0.91, 0.90, 0.89, 0.60, 0.58, 0.57], min_k=2, max_k=5) == 3
+    # Order of the input does not matter
+    assert choose_k([0.58, 0.91, 0.60, 0.90, 0.57, 0.89], min_k=2, max_k=5) == 3
+
+def test_choose_k_respects_bounds():
+    assert choose_k([0.9, 0.5, 0.49, 0.48], min_k=2, max_k=4) == 2
+    assert choose_k([0.9, 0.8], min_k=2, max_k=5) == 2
+    assert choose_k([0.9], min_k=2, max_k=5) == 1
+
+def test_choose_k_keeps_all_on_linear_decay():
+    assert choose_k([0.90, 0.89, 0.88, 0.87, 0.86], min_k=2, max_k=5) == 5
+
+# Joining chunks and packing the prompt context
+
+def test_merge_overlapping_text_drops_splitter_overlap():
+    left = "Gifts must be declared to the compliance team"
+    right = "to the compliance team within five days."
+    assert merge_overlapping_text(left, right, 100) == "Gifts must be declared to the compliance team within five days."
+
+def test_merge_overlapping_text_keeps_short_or_partial_matches():
+    # One shared word is coincidence, not overlap
+    assert merge_overlapping_text("Ask your manager", "manager approval is needed", 100) == \
+        "Ask your manager\nmanager approval is needed"
+    # A match that starts inside a word is not the splitter's overlap
+    assert merge_overlapping_text("the team leads the team", "ads the team today", 100) == \
+        "the team leads the team\nads the team today"
+
+def _passage(chunk_id, content, score, file_name="Gifts.pdf"):
+    return {"chunk_id": chunk_id, "content": content, "similarity_score": score, "source_info": {"file_name": file_name}}
+
+def test_pack_context_groups_and_merges(tmp_path):
+    file_index = FileChunkIndex(str(tmp_path / "file_index.json"))
+    file_index.set_file("/docs/Gifts.pdf", "hash", ["g0", "g1", "g2"])
+    docs = [
+        _passage("g1", "declared to the compliance team within five days.", 0.8),
+        _passage("l0", "Annual leave must be booked in advance.", 0.7, "Leave.pdf"),
+        _passage("g0", "Gifts from clients must be declared to the compliance team", 0.9),
+    ]
+    context, tokens, sources = pack_context(docs, 1000, file_index=file_index)
+    assert [(s["source_number"], s["file_name"]) for s in sources] == [(1, "Gifts.pdf"), (2, "Leave.pdf")]
+    assert sources[0]["passages"][0]["content"] == \
+        "Gifts from clients must be declared to the compliance team within five days."
+    assert sources[0]["passages"][0]["merged_passages"] == 2
+    assert context.startswith("[Source 1: Gifts.pdf] (Relevance: 0.900)\n")
+    assert "[Source 2: Leave.pdf] (Relevance: 0.700)" in context
+    assert tokens == count_tokens(context)
+
+def test_pack_context_respects_budget():
+    long_text = " ".join(f"Sentence number {i} of the travel policy." for i in range(200))
+    docs = [_passage("a", "Short gift rule.", 0.9), _passage("b", long_text, 0.8, "Travel.pdf")]
+    context, tokens, sources = pack_context(docs, 150)
+    assert tokens <= 150
+    # The long passage is cut at a sentence boundary to fill the rest of the budget
+    assert [s["file_name"] for s in sources] == ["Gifts.pdf", "Travel.pdf"]
+    assert sources[1]["passages"][0]["content"].endswith(" ...")
+    assert pack_context([], 150) == ("", 0, [])
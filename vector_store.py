@@ -1,92 +1,559 @@
 import os
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings
+import uuid
+import shutil
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Tuple
 from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 from config import Config
+from client_registry import get_embeddings, get_embedding_breaker, get_chroma_client
+from embedding_breaker import EmbeddingUnavailable
+from metadata_filters import build_metadata_filter, backfill_filter_metadata
+from chunk_index import FileChunkIndex, group_documents_by_file, find_orphaned_chunks, adopt_orphaned_chunks
+from local_index import (
+    open_local_index, collection_space, records_collection_name, write_records, migrate_to_records, sync_local_index,
+    fetch_embeddings, local_index_search, chroma_vector_search, hydrate_chunks
+)
+from bm25_index import BM25Index, sync_lexical_index, reciprocal_rank_fusion
+from document_summaries import DocumentSummaryIndex
+from pinned_chunks import PinnedChunkRules
+from context_expansion import expand_to_neighbors
+from diversity import mmr_select
+from score_normalization import normalize_score
+from adaptive_k import choose_k
+from sentence_index import SentenceIndex
+from answer_cache import SemanticAnswerCache
+
+# Recent query embeddings kept per manager
+QUERY_VECTOR_CACHE_SIZE = 256
 
 class VectorStoreManager:
     def __init__(self):
         self.config = Config()
-        self.embeddings = OpenAIEmbeddings(openai_api_key=self.config.OPENAI_API_KEY)
-        
-        # Initialize ChromaDB client
-        self.chroma_client = chromadb.PersistentClient(
-            path=self.config.CHROMA_DB_PATH,
-            settings=Settings(anonymized_telemetry=False)
-        )
+        # Process-wide clients, shared with every other manager on the same store
+        self.embeddings = get_embeddings()
+        self.chroma_client = self._create_chroma_client()
         
         # Collection name for policy documents
         self.collection_name = "policy_documents"
+        self.vector_collection_name = self.collection_name
+        if self.config.INDEX_BACKEND != "chroma":
+            # A local index backend keeps the vectors; Chroma only stores the chunk records
+            self.collection_name = records_collection_name(self.collection_name)
+        # Distances follow the space the store was created with; HNSW_SPACE only applies to new collections
+        self.space = self._stored_space(self.collection_name, self.vector_collection_name)
+        
+        # Side indexes belong to this store only, never to another path or server using the same CHROMA_DB_PATH
+        self.store_paths = self.config.store_index_paths(self._store_location(), self.vector_collection_name)
+        self._adopt_legacy_side_indexes()
+        self.file_index = FileChunkIndex(self.store_paths["file_index"])
+        self.local_index = open_local_index(self.config, self.store_paths["dir"], self.space)
+        self.lexical_index = BM25Index(self.store_paths["bm25_index"])
+        self.pinned_rules = PinnedChunkRules.load(self.config.PINNED_RULES_PATH)
+        self.answer_cache = SemanticAnswerCache(
+            self.store_paths["answer_cache"], self.config.ANSWER_CACHE_SIMILARITY, self.config.ANSWER_CACHE_MAX_ENTRIES
+        ) if self.config.ANSWER_CACHE else None
+        self.embedding_breaker = get_embedding_breaker()
+        self._query_vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_vector_lock = threading.Lock()
+        # Serializes writes (add, delete, reconcile, clear) so a shared manager is safe to use from any thread
+        self._write_lock = threading.RLock()
         self.vectorstore = None
         self._initialize_vectorstore()
+        self.document_summaries = DocumentSummaryIndex(
+            self.chroma_client, self.embeddings, self.config.hnsw_collection_metadata()
+        )
+        # Sentence vectors go to the configured local backend like the chunk vectors (Chroma only for "chroma")
+        self.sentence_index = SentenceIndex(
+            self.chroma_client, self.embeddings, self.config.hnsw_collection_metadata(),
+            open_local_index(self.config, os.path.join(self.store_paths["dir"], "sentences"), self.space)
+        ) if self.config.SENTENCE_INDEX else None
+    
+    def _create_chroma_client(self):
+        """The Chroma client of the store (the PersistentClient for CHROMA_DB_PATH)"""
+        return get_chroma_client(self.config.CHROMA_DB_PATH)
+    
+    def _store_location(self) -> str:
+        """Where the store lives; side indexes are kept apart per location"""
+        return os.path.abspath(self.config.CHROMA_DB_PATH)
+    
+    def _adopt_legacy_side_indexes(self):
+        """Move side indexes that earlier versions kept directly under CHROMA_DB_PATH into this store's directory"""
+        if os.path.exists(self.store_paths["dir"]):
+            return
+        os.makedirs(self.store_paths["dir"])
+        targets = {
+            "file_chunk_index.json": self.store_paths["file_index"],
+            "bm25_index.sqlite3": self.store_paths["bm25_index"],
+            "answer_cache.sqlite3": self.store_paths["answer_cache"]
+        }
+        for backend in ("int8", "float16", "ivf"):
+            targets[f"{backend}_index"] = os.path.join(self.store_paths["dir"], f"{backend}_index")
+        for name, target in targets.items():
+            legacy = os.path.join(self.config.CHROMA_DB_PATH, name)
+            if os.path.exists(legacy) and not os.path.exists(target):
+                shutil.move(legacy, target)
+                print(f"Moved {legacy} to {target}")
     
     def _initialize_vectorstore(self):
         """Initialize or load existing vectorstore"""
+        if self.local_index is not None:
+            self._initialize_records()
+            return
         try:
             # Try to get existing collection
             collection = self.chroma_client.get_collection(name=self.collection_name)
             self.vectorstore = Chroma(
                 client=self.chroma_client,
                 collection_name=self.collection_name,
-                embedding_function=self.embeddings
+                embedding_function=self.embeddings,
+                collection_metadata=self.config.hnsw_collection_metadata()
             )
+            self._apply_search_ef(collection)
+            sync_lexical_index(self.lexical_index, collection)
+            self._sync_file_index(collection)
+            self._backfill_filter_metadata(collection)
             print(f"Loaded existing vectorstore with {collection.count()} documents")
         except Exception:
             # Create new collection if it doesn't exist
             self.vectorstore = Chroma(
                 client=self.chroma_client,
                 collection_name=self.collection_name,
-                embedding_function=self.embeddings
+                embedding_function=self.embeddings,
+                collection_metadata=self.config.hnsw_collection_metadata()
             )
-            print("Created new vectorstore")
+            print(f"Created new vectorstore (HNSW space={self.config.HNSW_SPACE}, M={self.config.HNSW_M}, "
+                  f"ef_construction={self.config.HNSW_EF_CONSTRUCTION}, ef_search={self.config.HNSW_EF_SEARCH})")
     
-    def add_documents(self, documents: List[Document]) -> bool:
-        """Add documents to the vectorstore"""
+    def _initialize_records(self):
+        """Open the records collection of a local index backend, migrating chunks stored with Chroma vectors on first use"""
+        collection = self.chroma_client.get_or_create_collection(
+            name=self.collection_name, metadata={**self.config.hnsw_collection_metadata(), "hnsw:space": self.space}
+        )
+        if collection.count() == 0:
+            try:
+                source = self.chroma_client.get_collection(name=self.vector_collection_name)
+                if source.count():
+                    migrate_to_records(source, collection, self.local_index)
+            except Exception:
+                # Nothing stored with Chroma vectors yet
+                pass
+        sync_local_index(self.local_index, collection, self.embeddings)
+        sync_lexical_index(self.lexical_index, collection)
+        self._sync_file_index(collection)
+        self._backfill_filter_metadata(collection)
+        print(f"Loaded {collection.count()} documents ({self.config.INDEX_BACKEND} index, vectors kept out of Chroma)")
+    
+    def _sync_file_index(self, collection):
+        """Register files the store holds but this file index has never seen (a new store directory, or another replica's ingests)"""
+        if len(self.file_index.all_chunk_ids()) >= collection.count():
+            return
+        report = find_orphaned_chunks(collection, self.file_index)
+        if report["unindexed_files"]:
+            adopted = adopt_orphaned_chunks(collection, self.file_index, report["unindexed_files"])
+            print(f"Added {adopted} existing chunks of {len(report['unindexed_files'])} files to the file index")
+    
+    def _backfill_filter_metadata(self, collection):
+        """Give chunks ingested before section and category filtering existed those keys (once per store)"""
+        marker = os.path.join(self.store_paths["dir"], "filter_metadata_backfilled")
+        if os.path.exists(marker):
+            return
         try:
-            if not documents:
-                return False
-            
-            # Add documents to vectorstore
-            self.vectorstore.add_documents(documents)
-            print(f"Added {len(documents)} documents to vectorstore")
-            return True
+            updated = backfill_filter_metadata(collection)
+            if updated:
+                print(f"Added section and category metadata to {updated} existing chunks")
+            os.makedirs(self.store_paths["dir"], exist_ok=True)
+            open(marker, "w").close()
         except Exception as e:
-            print(f"Error adding documents to vectorstore: {str(e)}")
-            return False
+            print(f"Error adding section and category metadata: {str(e)}")
     
-    def similarity_search(self, query: str, k: int = 5) -> List[Document]:
-        """Perform similarity search and return relevant documents"""
+    def _stored_space(self, *collection_names: str) -> str:
+        """Distance space of the first of the collections that exists (HNSW_SPACE for a new store)"""
+        for name in collection_names:
+            try:
+                return collection_space(self.chroma_client.get_collection(name=name), self.config.HNSW_SPACE)
+            except Exception:
+                continue
+        return self.config.HNSW_SPACE
+    
+    def _apply_search_ef(self, collection):
+        """Apply the configured ef_search to an existing collection (other HNSW parameters are fixed at creation)"""
         try:
-            results = self.vectorstore.similarity_search(query, k=k)
-            return results
+            collection.modify(configuration={"hnsw": {"ef_search": self.config.HNSW_EF_SEARCH}})
+        except Exception:
+            # Older Chroma releases read HNSW settings from collection metadata
+            try:
+                metadata = dict(collection.metadata or {})
+                if metadata.get("hnsw:search_ef") != self.config.HNSW_EF_SEARCH:
+                    metadata["hnsw:search_ef"] = self.config.HNSW_EF_SEARCH
+                    collection.modify(metadata=metadata)
+            except Exception as e:
+                print(f"Could not apply ef_search={self.config.HNSW_EF_SEARCH}: {str(e)}")
+    
+    def add_documents(self, documents: List[Document]) -> bool:
+        """Add documents to the vectorstore, replacing earlier versions of the same files"""
+        with self._write_lock:
+            try:
+                if not documents:
+                    return False
+                
+                for file_key, file_documents in group_documents_by_file(documents).items():
+                    if not file_key:
+                        # No file information, nothing to index against
+                        chunk_ids = self._write_chunks(file_documents)
+                        self._index_chunks(chunk_ids, file_documents)
+                        continue
+                    self._replace_file_chunks(file_documents)
+                
+                print(f"Added {len(documents)} documents to vectorstore")
+                return True
+            except Exception as e:
+                print(f"Error adding documents to vectorstore: {str(e)}")
+                return False
+    
+    def _replace_file_chunks(self, file_documents: List[Document]) -> List[str]:
+        """Write a file's chunks under deterministic IDs, then drop the chunks they supersede"""
+        metadata = file_documents[0].metadata
+        source = metadata.get("source") or metadata.get("filename")
+        file_key = FileChunkIndex.file_key(source)
+        file_hash = metadata.get("file_hash", "unknown")
+        
+        chunk_ids = [
+            FileChunkIndex.make_chunk_id(file_key, file_hash, doc.metadata.get("chunk_index", i))
+            for i, doc in enumerate(file_documents)
+        ]
+        previous_ids = self.file_index.get_chunk_ids(source)
+        
+        # New chunks are upserted before old ones are removed, so the file never disappears mid-update
+        self._write_chunks(file_documents, chunk_ids)
+        self._index_chunks(chunk_ids, file_documents)
+        new_ids = set(chunk_ids)
+        stale_ids = [chunk_id for chunk_id in previous_ids if chunk_id not in new_ids]
+        if stale_ids:
+            self.chroma_client.get_collection(name=self.collection_name).delete(ids=stale_ids)
+            self._unindex_chunks(stale_ids)
+        
+        self.file_index.set_file(source, file_hash, chunk_ids)
+        self.document_summaries.upsert(file_documents)
+        return stale_ids
+    
+    def _write_chunks(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """Embed and store chunks: in Chroma, or as records plus local index vectors for a local backend"""
+        if self.local_index is None:
+            return self.vectorstore.add_documents(documents, ids=ids)
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        texts = [doc.page_content for doc in documents]
+        embeddings = self.embeddings.embed_documents(texts)
+        collection = self.chroma_client.get_collection(name=self.collection_name)
+        write_records(collection, ids, texts, [doc.metadata for doc in documents])
+        self.local_index.add(ids, embeddings)
+        self.local_index.save()
+        return ids
+    
+    def _index_chunks(self, chunk_ids: List[str], documents: List[Document]):
+        """Mirror newly written chunks into the lexical and sentence indexes, as configured"""
+        if not chunk_ids:
+            return
+        self.lexical_index.add(zip(chunk_ids, [doc.page_content for doc in documents]))
+        self.lexical_index.save()
+        if self.sentence_index is not None:
+            self.sentence_index.add_chunks(list(chunk_ids), documents)
+    
+    def _unindex_chunks(self, chunk_ids: List[str]):
+        """Drop deleted chunks from the lexical, sentence and local vector indexes, and the answers grounded on them"""
+        if not chunk_ids:
+            return
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_chunks(chunk_ids)
+        self.lexical_index.remove(chunk_ids)
+        self.lexical_index.save()
+        if self.sentence_index is not None:
+            self.sentence_index.remove_chunks(list(chunk_ids))
+        if self.local_index is None:
+            return
+        self.local_index.remove(chunk_ids)
+        self.local_index.save()
+    
+    def similarity_search(self, query: str, k: int = 5, file_name=None, section=None, category=None) -> List[Document]:
+        """Perform similarity search and return relevant documents.
+        
+        file_name, section and category (a value or a list of values) are pushed
+        down into the Chroma query, so only matching chunks are ranked.
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, file_name, section, category)]
+    
+    def similarity_search_with_score(self, query: str, k: int = 5, file_name=None, section=None, category=None) -> List[tuple]:
+        """Perform similarity search with scores, optionally scoped by metadata.
+        
+        Without an explicit file_name, two-stage retrieval first shortlists the
+        documents whose summary vectors are closest to the query and then ranks
+        only their chunks.
+        """
+        try:
+            query_vector = self.embeddings.embed_query(query)
+            return self._vector_search(query_vector, k, file_name, section, category)
         except Exception as e:
-            print(f"Error performing similarity search: {str(e)}")
+            print(f"Error performing similarity search with score: {str(e)}")
             return []
     
-    def similarity_search_with_score(self, query: str, k: int = 5) -> List[tuple]:
-        """Perform similarity search with scores"""
+    def hybrid_search_with_score(self, query: str, k: int = 5, file_name=None, section=None, category=None) -> List[tuple]:
+        """Fuse vector and BM25 results by reciprocal rank.
+        
+        BM25 runs over the whole corpus (or the metadata scope), so chunks that
+        contain the exact query terms are found even when they fall outside the
+        vector top-k. Scores are vector distances, computed exactly for chunks
+        only the lexical side found.
+        """
+        results, _ = self.retrieve_with_mode(query, k, file_name, section, category, hybrid=True)
+        return results
+    
+    def retrieve_with_mode(self, query: str, k: int = 5, file_name=None, section=None, category=None,
+                           hybrid: Optional[bool] = None) -> Tuple[List[tuple], str]:
+        """Retrieve (document, score) pairs and report the mode that served them.
+        
+        The query embedding runs under EMBEDDING_TIMEOUT. If it is late or fails,
+        results come from the BM25 index alone and the mode is "lexical"; their
+        scores are BM25 scores scaled so the best match is 1.0. Otherwise the
+        mode is "hybrid" or "vector".
+        """
         try:
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
-            return results
+            query_vector = self._embed_query_with_deadline(query)
+            return self._retrieve_for_vector(query, query_vector, k, file_name, section, category, hybrid)
         except Exception as e:
-            print(f"Error performing similarity search with score: {str(e)}")
+            print(f"Error retrieving documents: {str(e)}")
+            return [], "error"
+    
+    def _retrieve_for_vector(self, query: str, query_vector: Optional[List[float]], k: int, file_name=None, section=None,
+                             category=None, hybrid: Optional[bool] = None) -> Tuple[List[tuple], str]:
+        """retrieve_with_mode for an already embedded query (None when the embedding failed)"""
+        hybrid = self.config.HYBRID_RETRIEVAL if hybrid is None else hybrid
+        if query_vector is None:
+            return self._lexical_only_search(query, k, file_name, section, category), "lexical"
+        if not hybrid:
+            return self._vector_search(query_vector, k, file_name, section, category), "vector"
+        
+        candidate_k = max(k * 2, self.config.HYBRID_CANDIDATES)
+        vector_hits = self._vector_search(query_vector, candidate_k, file_name, section, category)
+        lexical_hits = self._lexical_search(query, candidate_k, file_name, section, category)
+        
+        fused = reciprocal_rank_fusion(
+            [[doc.id for doc, _ in vector_hits], [chunk_id for chunk_id, _ in lexical_hits]],
+            k=self.config.RRF_K
+        )[:k]
+        
+        found = {doc.id: (doc, distance) for doc, distance in vector_hits}
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in found]
+        if missing:
+            collection = self.chroma_client.get_collection(name=self.collection_name)
+            hydrated = hydrate_chunks(collection, missing, query_vector, self.space, self.local_index)
+            found.update((chunk_id, hit) for chunk_id, hit in hydrated.items() if hit[1] is not None)
+        return [found[chunk_id] for chunk_id, _ in fused if chunk_id in found], "hybrid"
+    
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """Query embedding as retrieval will use it (None when the embedding API is degraded)"""
+        return self._embed_query_with_deadline(query)
+    
+    async def aembed_query(self, query: str) -> Optional[List[float]]:
+        """embed_query through the embedding client's async API, without blocking the event loop"""
+        query_vector = self._memoized_query_vector(query)
+        if query_vector is not None:
+            return query_vector
+        
+        try:
+            query_vector = await self.embedding_breaker.acall(
+                self.embeddings.aembed_query, query, timeout=self.config.EMBEDDING_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            print(f"Query embedding exceeded {self.config.EMBEDDING_TIMEOUT}s, serving lexical results only")
+        except EmbeddingUnavailable as e:
+            print(f"Query embedding skipped, serving lexical results only: {str(e)}")
+        except Exception as e:
+            print(f"Query embedding failed, serving lexical results only: {str(e)}")
+        self._remember_query_vectors({query: query_vector})
+        return query_vector
+    
+    def _embed_query_with_deadline(self, query: str) -> Optional[List[float]]:
+        """Embed the query, or return None if the embedding API misses the deadline or fails.
+        
+        Recent embeddings are memoized, so a caller that embeds the question
+        before retrieval does not pay for a second embedding call. A timeout or
+        failure opens the process-wide embedding breaker: for the next
+        FAILED_EMBEDDING_TTL seconds every query is served lexically without
+        calling the API.
+        """
+        return self.embed_queries([query])[query]
+    
+    def embed_queries(self, queries: List[str]) -> Dict[str, Optional[List[float]]]:
+        """Embed several queries in one API call under a single EMBEDDING_TIMEOUT deadline.
+        
+        Used for the extra queries of query expansion, so a slow embedding API
+        costs one deadline rather than one per query. Queries embedded recently
+        are not sent again; all others map to None when the call is late or fails.
+        """
+        vectors = {query: self._memoized_query_vector(query) for query in queries}
+        missing = list(dict.fromkeys(query for query, vector in vectors.items() if vector is None))
+        if not missing:
+            return vectors
+        
+        try:
+            if len(missing) == 1:
+                embedded = [self.embedding_breaker.call(
+                    self.embeddings.embed_query, missing[0], timeout=self.config.EMBEDDING_TIMEOUT
+                )]
+            else:
+                embedded = self.embedding_breaker.call(
+                    self.embeddings.embed_documents, missing, timeout=self.config.EMBEDDING_TIMEOUT
+                )
+            vectors.update(zip(missing, embedded))
+        except FutureTimeoutError:
+            print(f"Query embedding exceeded {self.config.EMBEDDING_TIMEOUT}s, serving lexical results only")
+        except EmbeddingUnavailable as e:
+            print(f"Query embedding skipped, serving lexical results only: {str(e)}")
+        except Exception as e:
+            print(f"Query embedding failed, serving lexical results only: {str(e)}")
+        self._remember_query_vectors(vectors)
+        return vectors
+    
+    def _memoized_query_vector(self, query: str) -> Optional[List[float]]:
+        with self._query_vector_lock:
+            query_vector = self._query_vectors.get(query)
+            if query_vector is not None:
+                self._query_vectors.move_to_end(query)
+            return query_vector
+    
+    def _remember_query_vectors(self, vectors: Dict[str, Optional[List[float]]]):
+        """Memoize successful embeddings (failures are handled by the embedding breaker)"""
+        with self._query_vector_lock:
+            for query, query_vector in vectors.items():
+                if query_vector is None:
+                    continue
+                self._query_vectors[query] = query_vector
+                self._query_vectors.move_to_end(query)
+            while len(self._query_vectors) > QUERY_VECTOR_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+    
+    def _lexical_only_search(self, query: str, k: int, file_name=None, section=None, category=None) -> List[tuple]:
+        """Degraded retrieval from the BM25 index, with scores scaled to the best match"""
+        lexical_hits = self._lexical_search(query, k, file_name, section, category)
+        if not lexical_hits:
             return []
+        collection = self.chroma_client.get_collection(name=self.collection_name)
+        found = hydrate_chunks(collection, [chunk_id for chunk_id, _ in lexical_hits])
+        top_score = lexical_hits[0][1] or 1.0
+        return [(found[chunk_id][0], score / top_score) for chunk_id, score in lexical_hits if chunk_id in found]
+    
+    def _vector_search(self, query_vector: List[float], k: int, file_name=None, section=None, category=None) -> List[tuple]:
+        """Vector search for an embedded query, with two-stage shortlisting when no file is given"""
+        if not file_name and self._two_stage_ready():
+            file_name = self.document_summaries.shortlist(query_vector, self.config.DOCUMENT_SHORTLIST_SIZE) or None
+        where = build_metadata_filter(file_name=file_name, section=section, category=category)
+        return self._search_by_vector(query_vector, k, where)
+    
+    def _lexical_search(self, query: str, k: int, file_name=None, section=None, category=None) -> List[tuple]:
+        """BM25 (chunk_id, score) pairs, restricted to the metadata scope when one is given"""
+        where = build_metadata_filter(file_name=file_name, section=section, category=category)
+        allowed_ids = None
+        if where:
+            collection = self.chroma_client.get_collection(name=self.collection_name)
+            allowed_ids = collection.get(where=where, include=[])["ids"]
+        return self.lexical_index.search(query, k, allowed_ids=allowed_ids)
+    
+    def _two_stage_ready(self) -> bool:
+        """Only shortlist when every indexed file has a summary vector"""
+        if not self.config.TWO_STAGE_RETRIEVAL or not self.file_index.files:
+            return False
+        return self.document_summaries.count() >= len(self.file_index.files)
+    
+    def _search_by_vector(self, query_vector: List[float], k: int, where: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """Rank chunks against an embedded query using the configured index backend"""
+        collection = self.chroma_client.get_collection(name=self.collection_name)
+        if self.local_index is not None:
+            return local_index_search(
+                self.local_index, collection, query_vector, k, where=where,
+                rescore=self.config.QUANTIZED_RESCORE, rescore_factor=self.config.RESCORE_FACTOR,
+                space=self.space
+            )
+        return chroma_vector_search(collection, query_vector, k, where=where)
+    
+    def get_relevant_documents_with_sources(self, query: str, k: int = 5, file_name=None, section=None, category=None,
+                                            mmr_lambda: Optional[float] = None,
+                                            min_similarity: Optional[float] = None,
+                                            adaptive_k: bool = False) -> List[Dict[str, Any]]:
+        """Get relevant documents with enhanced source information, optionally scoped by metadata.
+        
+        Each result carries the retrieval_mode that produced it (hybrid, vector or lexical).
+        similarity_score is a 0..1 similarity (higher is better) whatever the index
+        backend and distance metric; the raw vector distance is kept as distance.
+        Candidates below min_similarity (MIN_SIMILARITY by default) are dropped.
+        With mmr_lambda below 1 (MMR_LAMBDA by default), MMR_FETCH_K candidates are
+        retrieved and k of them chosen by maximal marginal relevance, so
+        near-duplicate chunks do not crowd out other relevant passages.
+        With adaptive_k, k is an upper bound: the number kept (at least
+        ADAPTIVE_K_MIN) is chosen from the gap or elbow in the candidate scores.
+        """
+        query_vector = self._embed_query_with_deadline(query)
+        return self._relevant_documents_for_vector(
+            query, query_vector, k, file_name, section, category, mmr_lambda, min_similarity, adaptive_k
+        )
     
-    def get_relevant_documents_with_sources(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Get relevant documents with enhanced source information"""
+    async def aget_relevant_documents_with_sources(self, query: str, k: int = 5, file_name=None, section=None,
+                                                   category=None, mmr_lambda: Optional[float] = None,
+                                                   min_similarity: Optional[float] = None,
+                                                   adaptive_k: bool = False) -> List[Dict[str, Any]]:
+        """get_relevant_documents_with_sources for the event loop.
+        
+        The query is embedded with the async client; the Chroma, BM25 and
+        sentence lookups that follow have no async API and run in a worker thread.
+        """
+        query_vector = await self.aembed_query(query)
+        return await asyncio.to_thread(
+            self._relevant_documents_for_vector,
+            query, query_vector, k, file_name, section, category, mmr_lambda, min_similarity, adaptive_k
+        )
+    
+    def _relevant_documents_for_vector(self, query: str, query_vector: Optional[List[float]], k: int, file_name,
+                                       section, category, mmr_lambda: Optional[float],
+                                       min_similarity: Optional[float], adaptive_k: bool) -> List[Dict[str, Any]]:
+        """get_relevant_documents_with_sources for an already embedded query (None when the embedding failed)"""
         try:
-            # Get similarity search results with scores
-            results = self.similarity_search_with_score(query, k=k)
+            min_similarity = self.config.MIN_SIMILARITY if min_similarity is None else min_similarity
+            mmr_lambda = self.config.MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+            use_mmr = mmr_lambda < 1.0
+            fetch_k = max(k, self.config.MMR_FETCH_K) if use_mmr or adaptive_k else k
+            
+            results, mode = self._retrieve_for_vector(query, query_vector, fetch_k, file_name, section, category)
+            if min_similarity > 0:
+                results = [
+                    (doc, score) for doc, score in results
+                    if normalize_score(score, mode, self.space) >= min_similarity
+                ]
+            if adaptive_k and results:
+                k = choose_k(
+                    [normalize_score(score, mode, self.space) for _, score in results],
+                    min(self.config.ADAPTIVE_K_MIN, k), k, self.config.ADAPTIVE_K_MIN_GAP
+                )
+            if use_mmr and len(results) > k:
+                results = self._mmr_rerank(results, k, mmr_lambda, query_vector, mode)
+            results = results[:k]
+            supporting = {}
+            if self.sentence_index is not None:
+                supporting = self.sentence_index.best_sentences(
+                    [doc.id for doc, _ in results], self.config.SENTENCES_PER_CHUNK, query_vector, query
+                )
             
             enhanced_results = []
             for doc, score in results:
                 result_info = {
+                    "chunk_id": doc.id,
                     "content": doc.page_content,
                     "metadata": doc.metadata,
-                    "similarity_score": float(score),
+                    "similarity_score": normalize_score(float(score), mode, self.space),
+                    "distance": None if mode == "lexical" else float(score),
+                    "retrieval_mode": mode,
+                    "supporting_sentences": supporting.get(doc.id, []),
                     "source_info": self._format_source_info(doc.metadata)
                 }
                 enhanced_results.append(result_info)
@@ -96,6 +563,66 @@ class VectorStoreManager:
             print(f"Error getting relevant documents with sources: {str(e)}")
             return []
     
+    def _mmr_rerank(self, results: List[tuple], k: int, mmr_lambda: float, query_vector: Optional[List[float]],
+                    mode: str) -> List[tuple]:
+        """Select k of the (document, score) candidates by maximal marginal relevance"""
+        ids, vectors = self._chunk_vectors([doc.id for doc, _ in results])
+        row = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        results = [(doc, score) for doc, score in results if doc.id in row]
+        if len(results) <= k:
+            return results
+        vectors = vectors[[row[doc.id] for doc, _ in results]]
+        if query_vector is not None:
+            picks = mmr_select(vectors, k, mmr_lambda, query_vector=query_vector)
+        else:
+            # Lexical mode has no query vector; its scores are already "higher is better"
+            picks = mmr_select(vectors, k, mmr_lambda, relevance=[score for _, score in results])
+        return [results[i] for i in picks]
+    
+    def _chunk_vectors(self, chunk_ids: List[str]) -> Tuple[List[str], Any]:
+        """Float32 vectors of the given chunks, from the local index when one serves queries"""
+        if self.local_index is not None:
+            return self.local_index.vectors(chunk_ids)
+        collection = self.chroma_client.get_collection(name=self.collection_name)
+        return fetch_embeddings(collection, chunk_ids)
+    
+    def get_pinned_documents(self, query: str) -> List[Dict[str, Any]]:
+        """Chunks pinned to the query by the trigger rules, formatted like get_relevant_documents_with_sources"""
+        try:
+            collection = self.chroma_client.get_collection(name=self.collection_name)
+            pinned = self.pinned_rules.pinned_chunk_ids(query, collection, self.file_index.refresh())
+            found = hydrate_chunks(collection, [chunk_id for chunk_id, _ in pinned])
+            
+            pinned_results = []
+            for chunk_id, score in pinned:
+                if chunk_id not in found:
+                    continue
+                doc = found[chunk_id][0]
+                pinned_results.append({
+                    "chunk_id": chunk_id,
+                    "content": doc.page_content,
+                    "metadata": doc.metadata,
+                    "similarity_score": score,
+                    "retrieval_mode": "pinned",
+                    "source_info": self._format_source_info(doc.metadata)
+                })
+            return pinned_results
+        except Exception as e:
+            print(f"Error getting pinned documents: {str(e)}")
+            return []
+    
+    def expand_neighbors(self, results: List[Dict[str, Any]], window: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Replace each hit with a passage including its neighboring chunks, merging hits that overlap"""
+        window = self.config.NEIGHBOR_WINDOW if window is None else window
+        if window <= 0 or not results:
+            return results
+        try:
+            collection = self.chroma_client.get_collection(name=self.collection_name)
+            return expand_to_neighbors(results, self.file_index, collection, window, self.config.CHUNK_OVERLAP)
+        except Exception as e:
+            print(f"Error expanding neighboring chunks: {str(e)}")
+            return results
+    
     def _format_source_info(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Format source information for display"""
         reference_link = metadata.get("reference_link", {})
@@ -135,27 +662,114 @@ class VectorStoreManager:
     
     def delete_documents_by_file(self, file_path: str) -> bool:
         """Delete all documents from a specific file"""
-        try:
-            collection = self.chroma_client.get_collection(name=self.collection_name)
-            
-            # Get all document IDs for this file
-            results = collection.get(where={"source": file_path})
-            if results["ids"]:
-                collection.delete(ids=results["ids"])
-                print(f"Deleted {len(results['ids'])} documents for file: {file_path}")
-                return True
-            return False
-        except Exception as e:
-            print(f"Error deleting documents for file {file_path}: {str(e)}")
-            return False
+        with self._write_lock:
+            try:
+                collection = self.chroma_client.get_collection(name=self.collection_name)
+                
+                # Look up chunk IDs in the file index, falling back to the source path for unindexed files
+                chunk_ids = self.file_index.get_chunk_ids(file_path)
+                if not chunk_ids:
+                    chunk_ids = collection.get(where={"source": file_path}, include=[])["ids"]
+                
+                if chunk_ids:
+                    collection.delete(ids=chunk_ids)
+                    self.file_index.remove_file(file_path)
+                    self._unindex_chunks(chunk_ids)
+                    self.document_summaries.delete(file_path)
+                    print(f"Deleted {len(chunk_ids)} documents for file: {file_path}")
+                    return True
+                return False
+            except Exception as e:
+                print(f"Error deleting documents for file {file_path}: {str(e)}")
+                return False
+    
+    def reconcile_file_index(self, delete_orphans: bool = False, adopt_unindexed: bool = False) -> Dict[str, Any]:
+        """Find chunks the file index does not account for and optionally repair them"""
+        with self._write_lock:
+            try:
+                collection = self.chroma_client.get_collection(name=self.collection_name)
+                report = find_orphaned_chunks(collection, self.file_index)
+                
+                if adopt_unindexed and report["unindexed_files"]:
+                    adopted = adopt_orphaned_chunks(collection, self.file_index, report["unindexed_files"])
+                    report = find_orphaned_chunks(collection, self.file_index)
+                    report["adopted_chunks"] = adopted
+                
+                if delete_orphans:
+                    orphan_ids = [chunk_id for ids in report["orphaned_chunks"].values() for chunk_id in ids]
+                    if orphan_ids:
+                        collection.delete(ids=orphan_ids)
+                        self._unindex_chunks(orphan_ids)
+                    self.file_index.remove_chunk_ids(report["dangling_ids"])
+                    report["deleted_chunks"] = len(orphan_ids)
+                
+                return report
+            except Exception as e:
+                print(f"Error reconciling file index: {str(e)}")
+                return {"orphaned_chunks": {}, "orphaned_count": 0, "unindexed_files": [], "dangling_ids": [], "error": str(e)}
+    
+    def rebuild_document_summaries(self) -> int:
+        """Recompute the summary vector of every indexed file (backfills collections ingested before two-stage retrieval)"""
+        rebuilt = 0
+        collection = self.chroma_client.get_collection(name=self.collection_name)
+        for entry in list(self.file_index.files.values()):
+            try:
+                rows = collection.get(ids=entry["chunk_ids"], include=["documents", "metadatas"])
+                if not rows["ids"]:
+                    continue
+                file_documents = [
+                    Document(page_content=text, metadata=metadata or {})
+                    for text, metadata in zip(rows["documents"], rows["metadatas"])
+                ]
+                file_documents.sort(key=lambda doc: doc.metadata.get("chunk_index", 0))
+                self.document_summaries.upsert(file_documents)
+                rebuilt += 1
+            except Exception as e:
+                print(f"Error rebuilding summary for {entry.get('source')}: {str(e)}")
+        return rebuilt
+    
+    def rebuild_sentence_index(self) -> int:
+        """Index the sentences of every indexed chunk that has none yet (backfills older collections)"""
+        if self.sentence_index is None:
+            return 0
+        added = 0
+        collection = self.chroma_client.get_collection(name=self.collection_name)
+        for entry in list(self.file_index.files.values()):
+            try:
+                rows = collection.get(ids=entry["chunk_ids"], include=["documents", "metadatas"])
+                documents = [
+                    Document(page_content=text, metadata=metadata or {})
+                    for text, metadata in zip(rows["documents"], rows["metadatas"])
+                ]
+                added += self.sentence_index.add_chunks(rows["ids"], documents)
+            except Exception as e:
+                print(f"Error indexing sentences for {entry.get('source')}: {str(e)}")
+        return added
     
     def clear_all_documents(self) -> bool:
         """Clear all documents from the vectorstore"""
-        try:
-            collection = self.chroma_client.get_collection(name=self.collection_name)
-            collection.delete()
-            print("Cleared all documents from vectorstore")
-            return True
-        except Exception as e:
-            print(f"Error clearing vectorstore: {str(e)}")
-            return False
+        with self._write_lock:
+            try:
+                collection = self.chroma_client.get_collection(name=self.collection_name)
+                # Chroma refuses a delete without ids or a filter; take the IDs a page at a time
+                while True:
+                    ids = collection.get(include=[], limit=1000)["ids"]
+                    if not ids:
+                        break
+                    collection.delete(ids=ids)
+                self.file_index.clear()
+                self.document_summaries.clear()
+                if self.sentence_index is not None:
+                    self.sentence_index.clear()
+                if self.answer_cache is not None:
+                    self.answer_cache.clear()
+                self.lexical_index.clear()
+                self.lexical_index.save()
+                if self.local_index is not None:
+                    self.local_index.clear()
+                    self.local_index.save()
+                print("Cleared all documents from vectorstore")
+                return True
+            except Exception as e:
+                print(f"Error clearing vectorstore: {str(e)}")
+                return False
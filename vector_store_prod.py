@@ -1,105 +1,22 @@
 import os
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_core.documents import Document
-from config import Config
+from typing import Dict, Any
+from client_registry import get_chroma_http_client
+from vector_store import VectorStoreManager
 
-class ProductionVectorStoreManager:
-    def __init__(self):
-        self.config = Config()
-        self.embeddings = OpenAIEmbeddings(openai_api_key=self.config.OPENAI_API_KEY)
-        
-        # Production ChromaDB setup
-        chroma_host = os.getenv("CHROMA_DB_HOST", "localhost")
-        chroma_port = os.getenv("CHROMA_DB_PORT", "8000")
-        
-        # Initialize ChromaDB HTTP client for production
-        self.chroma_client = chromadb.HttpClient(
-            host=chroma_host,
-            port=int(chroma_port),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        
-        # Collection name for policy documents
-        self.collection_name = "policy_documents"
-        self.vectorstore = None
-        self._initialize_vectorstore()
+class ProductionVectorStoreManager(VectorStoreManager):
+    """VectorStoreManager on a Chroma server (CHROMA_DB_HOST / CHROMA_DB_PORT) instead of a local directory"""
     
-    def _initialize_vectorstore(self):
-        """Initialize or load existing vectorstore"""
-        try:
-            # Try to get existing collection
-            collection = self.chroma_client.get_collection(name=self.collection_name)
-            self.vectorstore = Chroma(
-                client=self.chroma_client,
-                collection_name=self.collection_name,
-                embedding_function=self.embeddings
-            )
-            print(f"✅ Loaded existing vectorstore with {collection.count()} documents")
-        except Exception:
-            # Create new collection if it doesn't exist
-            self.vectorstore = Chroma(
-                client=self.chroma_client,
-                collection_name=self.collection_name,
-                embedding_function=self.embeddings
-            )
-            print("✅ Created new vectorstore")
+    def _create_chroma_client(self):
+        # Production ChromaDB setup; the client is shared with every other manager on the same server
+        self.chroma_host = os.getenv("CHROMA_DB_HOST", "localhost")
+        self.chroma_port = os.getenv("CHROMA_DB_PORT", "8000")
+        return get_chroma_http_client(self.chroma_host, int(self.chroma_port))
     
-    def add_documents(self, documents: List[Document]) -> bool:
-        """Add documents to the vectorstore"""
-        try:
-            if not documents:
-                return False
-            
-            # Add documents to vectorstore
-            self.vectorstore.add_documents(documents)
-            print(f"✅ Added {len(documents)} documents to vectorstore")
-            return True
-        except Exception as e:
-            print(f"❌ Error adding documents to vectorstore: {str(e)}")
-            return False
+    def _store_location(self) -> str:
+        return f"http://{self.chroma_host}:{self.chroma_port}"
     
-    def similarity_search(self, query: str, k: int = 5) -> List[Document]:
-        """Perform similarity search and return relevant documents"""
-        try:
-            results = self.vectorstore.similarity_search(query, k=k)
-            return results
-        except Exception as e:
-            print(f"❌ Error performing similarity search: {str(e)}")
-            return []
-    
-    def similarity_search_with_score(self, query: str, k: int = 5) -> List[tuple]:
-        """Perform similarity search with scores"""
-        try:
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
-            return results
-        except Exception as e:
-            print(f"❌ Error performing similarity search with score: {str(e)}")
-            return []
-    
-    def get_relevant_documents_with_sources(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Get relevant documents with enhanced source information"""
-        try:
-            # Get similarity search results with scores
-            results = self.similarity_search_with_score(query, k=k)
-            
-            enhanced_results = []
-            for doc, score in results:
-                result_info = {
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "similarity_score": float(score),
-                    "source_info": self._format_source_info(doc.metadata)
-                }
-                enhanced_results.append(result_info)
-            
-            return enhanced_results
-        except Exception as e:
-            print(f"❌ Error getting relevant documents with sources: {str(e)}")
-            return []
+    def _adopt_legacy_side_indexes(self):
+        """Nothing to adopt: side indexes under CHROMA_DB_PATH belong to the local store"""
     
     def _format_source_info(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Format source information for display"""
@@ -146,33 +63,3 @@ class ProductionVectorStoreManager:
         except Exception as e:
             print(f"❌ Error getting collection stats: {str(e)}")
             return {"total_documents": 0, "unique_files": 0, "files": []}
-    
-    def delete_documents_by_file(self, file_path: str) -> bool:
-        """Delete all documents from a specific file"""
-        try:
-            collection = self.chroma_client.get_collection(name=self.collection_name)
-            
-            # Get all document IDs for this file
-            results = collection.get(where={"source": file_path})
-            if results["ids"]:
-                collection.delete(ids=results["ids"])
-                print(f"✅ Deleted {len(results['ids'])} documents for file: {file_path}")
-                return True
-            return False
-        except Exception as e:
-            print(f"❌ Error deleting documents for file {file_path}: {str(e)}")
-            return False
-    
-    def clear_all_documents(self) -> bool:
-        """Clear all documents from the vectorstore"""
-        try:
-            collection = self.chroma_client.get_collection(name=self.collection_name)
-            collection.delete()
-            print("✅ Cleared all documents from vectorstore")
-            return True
-        except Exception as e:
-            print(f"❌ Error clearing vectorstore: {str(e)}")
-            return False
-
-
-